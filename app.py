@@ -19,11 +19,32 @@ def create_app():
     from routes.main_routes import main
     from routes.quiz_routes import quiz
     from routes.interview_routes import interview
+    from routes.admin_routes import admin
 
     app.register_blueprint(auth)
     app.register_blueprint(main)
     app.register_blueprint(quiz)
     app.register_blueprint(interview)
+    app.register_blueprint(admin)
+
+    # Register CLI commands
+    from cli import register_cli, ensure_schema
+    register_cli(app)
+
+    # Add columns newer models declare to existing tables (the app has no migrations)
+    with app.app_context():
+        try:
+            ensure_schema()
+        except Exception as e:
+            print(f"Error checking database schema: {e}")
+
+    # Flush in-memory LLM usage counters on shutdown
+    from services.usage_service import init_usage
+    init_usage(app)
+
+    # Optional per-request profiling (no hooks registered when disabled)
+    from profiling import init_profiler
+    init_profiler(app)
 
     # User Loader
     @login_manager.user_loader
@@ -0,0 +1,137 @@
+"""
+Times grade_session (services/interview_grading.py) on a session of queued
+answers: its calls sent one after another with sync model calls, versus
+all at once on the shared LLM loop (services/llm_async.py), which is what
+grade_session does.
+
+Both runs grade the same answers with the same prompts and parsing; only
+how the model calls are sent differs. The model is replaced by a fake with
+a fixed latency that grades every item of a batch. Run from the repo root:
+
+    python benchmarks/bench_llm_fanout.py --answers 40 --subjects 4 --latency 0.5
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('SECRET_KEY', 'bench')
+os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.sqlite')
+
+
+class FakeUsage:
+    prompt_token_count = 400
+    candidates_token_count = 200
+    total_token_count = 600
+
+
+class FakeResponse:
+    usage_metadata = FakeUsage()
+
+    def __init__(self, max_items):
+        self.text = json.dumps({"grades": [
+            {"index": i, "score": 4, "feedback": "Clear and mostly complete answer."}
+            for i in range(1, max_items + 1)
+        ]})
+
+
+class FakeModel:
+    """Stands in for genai.GenerativeModel with a fixed network latency."""
+
+    def __init__(self, latency, max_items):
+        self.latency = latency
+        self.max_items = max_items
+
+    def generate_content(self, *args, **kwargs):
+        time.sleep(self.latency)
+        return FakeResponse(self.max_items)
+
+    async def generate_content_async(self, *args, **kwargs):
+        await asyncio.sleep(self.latency)
+        return FakeResponse(self.max_items)
+
+
+def install_fake_model(fake):
+    import services.gemini_service
+    import services.llm_async
+    import services.interview_grading
+    for module in (services.gemini_service, services.llm_async, services.interview_grading):
+        module.model = fake
+
+
+def gather_sequential(endpoint, requests, user_id=None):
+    """Same contract as gather_metered, one blocking call at a time."""
+    from services.gemini_service import model
+    from services.usage_service import check_quota, record_usage
+
+    check_quota(endpoint, user_id)
+    results = []
+    for contents, generation_config in requests:
+        try:
+            response = model.generate_content(contents, generation_config=generation_config)
+        except Exception as e:
+            results.append(e)
+            continue
+        record_usage(endpoint, response, user_id)
+        results.append(response)
+    return results
+
+
+def queue_session(user_id, token, answers, subjects):
+    from extensions import db
+    from models import PendingAnswer
+
+    for i in range(answers):
+        db.session.add(PendingAnswer(
+            session_token=token, subject=f"Subject {i % subjects}", level="Intermediate",
+            question_text=f"Question {i}?", user_answer=f"Answer {i}.", user_id=user_id
+        ))
+    db.session.commit()
+
+
+def timed_grade(user_id, token):
+    from services.interview_grading import grade_session
+
+    started = time.time()
+    results, failed = grade_session(user_id, token)
+    return time.time() - started, len(results), len(failed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--answers', type=int, default=40, help="Queued answers in the session.")
+    parser.add_argument('--subjects', type=int, default=4, help="Distinct subjects (one batch group each).")
+    parser.add_argument('--latency', type=float, default=0.5, help="Simulated model latency in seconds.")
+    args = parser.parse_args()
+
+    from app import create_app
+    from extensions import db
+    from models import User
+    import services.interview_grading as interview_grading
+
+    install_fake_model(FakeModel(args.latency, interview_grading.MAX_BATCH_ITEMS))
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        user = User(email="bench@example.com", password_hash="-")
+        db.session.add(user)
+        db.session.commit()
+
+        print(f"Simulated model latency: {args.latency}s, {args.answers} answers "
+              f"in {args.subjects} subjects, up to {interview_grading.MAX_BATCH_ITEMS} per call\n")
+
+        concurrent = interview_grading.gather_metered
+        for label, gather in (("sequential", gather_sequential), ("shared loop", concurrent)):
+            interview_grading.gather_metered = gather
+            queue_session(user.id, label.replace(' ', '-'), args.answers, args.subjects)
+            elapsed, graded, failed = timed_grade(user.id, label.replace(' ', '-'))
+            print(f"{label:<12} {elapsed:6.2f}s  graded={graded} failed={failed}")
+        interview_grading.gather_metered = concurrent
+
+
+if __name__ == "__main__":
+    main()
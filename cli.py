@@ -0,0 +1,265 @@
+import click
+from flask.cli import AppGroup
+from sqlalchemy import inspect, text, case, or_
+from extensions import db
+from models import QuizResult, InterviewResult
+from services.subject_service import canonicalize_subject, SUBJECTS
+
+subjects_cli = AppGroup('subjects', help="Subject canonicalization commands.")
+items_cli = AppGroup('items', help="Question item-analysis commands.")
+export_cli = AppGroup('export', help="Bulk export of results for placement-cell reporting.")
+questions_cli = AppGroup('questions', help="Question bank commands.")
+usage_cli = AppGroup('usage', help="LLM usage accounting commands.")
+interviews_cli = AppGroup('interviews', help="Interview answer grading commands.")
+
+
+def _ensure_column(model, column_name, ddl_type):
+    """Adds a nullable column to an existing table (the app has no migrations)."""
+    table_name = model.__tablename__
+    columns = [c['name'] for c in inspect(db.engine).get_columns(table_name)]
+    if column_name in columns:
+        return False
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {ddl_type}"))
+            conn.execute(text(f"CREATE INDEX ix_{table_name}_{column_name} ON {table_name} ({column_name})"))
+    except Exception:
+        # Another worker starting at the same time may have added it first
+        columns = [c['name'] for c in inspect(db.engine).get_columns(table_name)]
+        if column_name not in columns:
+            raise
+        return False
+    return True
+
+
+def ensure_schema():
+    """
+    Adds columns that the models declare but tables created by older
+    versions lack (db.create_all() only creates missing tables).
+    Runs on every app start; cheap when the schema is already current.
+    """
+    tables = inspect(db.engine).get_table_names()
+    for model in (QuizResult, InterviewResult):
+        if model.__tablename__ in tables and _ensure_column(model, 'subject_id', 'VARCHAR(64)'):
+            print(f"Added subject_id column to {model.__tablename__}; run 'flask subjects backfill' to fill it.")
+
+
+@subjects_cli.command('backfill')
+@click.option('--batch-size', default=1000, show_default=True, help="Rows updated per commit.")
+def backfill_subjects(batch_size):
+    """
+    Fills subject_id on existing quiz and interview results, and rewrites
+    subject to the canonical name for known subjects so old spellings
+    ("OS", "operating system ") no longer show up as separate subjects.
+    """
+    db.create_all()
+
+    for model in (QuizResult, InterviewResult):
+        if _ensure_column(model, 'subject_id', 'VARCHAR(64)'):
+            click.echo(f"Added subject_id column to {model.__tablename__}.")
+
+        # Canonical name for known subject IDs, the row's own subject otherwise
+        canonical_name = case(
+            {subject_id: info['name'] for subject_id, info in SUBJECTS.items()},
+            value=model.subject_id, else_=model.subject
+        )
+
+        updated = 0
+        last_id = 0
+        while True:
+            # Keyset pagination so each batch is a cheap index range scan
+            rows = db.session.query(model.id, model.subject).filter(
+                or_(model.subject_id.is_(None), model.subject != canonical_name),
+                model.id > last_id
+            ).order_by(model.id).limit(batch_size).all()
+            if not rows:
+                break
+
+            mappings = []
+            for row_id, subject in rows:
+                subject_id, name = canonicalize_subject(subject)
+                if subject_id in SUBJECTS:
+                    mappings.append({'id': row_id, 'subject_id': subject_id, 'subject': name})
+                elif subject_id:
+                    mappings.append({'id': row_id, 'subject_id': subject_id})
+            if mappings:
+                db.session.bulk_update_mappings(model, mappings)
+                db.session.commit()
+
+            updated += len(mappings)
+            last_id = rows[-1][0]
+
+        click.echo(f"{model.__tablename__}: backfilled {updated} rows.")
+
+
+@items_cli.command('analyze')
+@click.option('--batch-size', default=5000, show_default=True, help="Quiz results per batch.")
+@click.option('--full', is_flag=True, help="Rebuild all statistics instead of resuming from the last run.")
+def analyze_items(batch_size, full):
+    """Computes difficulty, discrimination and distractor statistics per question."""
+    from services.item_analysis import run_item_analysis
+    db.create_all()
+    run_item_analysis(batch_size=batch_size, full=full, log=click.echo)
+
+
+@items_cli.command('report')
+@click.option('--subject', default=None, help="Subject text or ID to filter by.")
+@click.option('--limit', default=20, show_default=True)
+def report_items(subject, limit):
+    """Lists questions flagged as too easy, too hard or non-discriminating."""
+    from services.item_analysis import flagged_questions, distractor_stats
+    from models import QuestionStat
+
+    if subject:
+        subject_id, _ = canonicalize_subject(subject)
+        rows = flagged_questions(subject_id, limit=limit)
+    else:
+        rows = QuestionStat.query.order_by(QuestionStat.discrimination).limit(limit).all()
+
+    for stat in rows:
+        click.echo(f"[{stat.subject_id}] n={stat.attempts} p={stat.difficulty:.2f} "
+                   f"r={stat.discrimination:.2f}  {stat.question_text[:80]}")
+        for option in distractor_stats(stat):
+            mean = "-" if option['mean_rest_score'] is None else f"{option['mean_rest_score']:.2f}"
+            click.echo(f"    {option['option']:<9} share={option['share']:.2f} mean_rest={mean}")
+
+
+@export_cli.command('results')
+@click.argument('kind', type=click.Choice(['quiz', 'interview']))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), default='csv', show_default=True)
+@click.option('--start', default=None, help="Include results on or after this date (YYYY-MM-DD).")
+@click.option('--end', default=None, help="Include results on or before this date (YYYY-MM-DD).")
+@click.option('--subject', default=None, help="Subject text or ID.")
+@click.option('--user', 'users', multiple=True, help="User ID or email; repeat for several users.")
+@click.option('--users-file', type=click.File('r'), default=None, help="File with one user ID or email per line.")
+@click.option('--include-answers', is_flag=True, help="Include quiz questions and answers (quiz only).")
+@click.option('--output', '-o', type=click.File('w', encoding='utf-8'), default='-', help="Output file (default: stdout).")
+def export_results(kind, fmt, start, end, subject, users, users_file, include_answers, output):
+    """Streams quiz or interview results as CSV or JSON Lines."""
+    from services.export_service import stream_export, parse_date
+
+    user_list = list(users)
+    if users_file:
+        user_list += [line.strip() for line in users_file if line.strip()]
+
+    try:
+        chunks = stream_export(
+            kind, fmt,
+            start=parse_date(start),
+            end=parse_date(end),
+            subject=subject,
+            users=user_list or None,
+            include_answers=include_answers
+        )
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+
+    for chunk in chunks:
+        output.write(chunk)
+
+
+@questions_cli.command('import')
+@click.argument('path', type=click.File('r', encoding='utf-8'))
+@click.option('--subject', default=None, help="Subject for records that do not specify one.")
+@click.option('--level', default=None, help="Level for records that do not specify one.")
+@click.option('--batch-size', default=1000, show_default=True, help="Records upserted per transaction.")
+def import_question_bank(path, subject, level, batch_size):
+    """Imports a JSON array or JSON Lines question bank."""
+    from services.import_service import import_questions
+    db.create_all()
+    import_questions(path, default_subject=subject, default_level=level,
+                     batch_size=batch_size, log=click.echo)
+
+
+@questions_cli.command('resign')
+@click.option('--batch-size', default=500, show_default=True, help="Questions updated per commit.")
+def resign_questions(batch_size):
+    """Recomputes MinHash signatures and LSH bands of stored questions."""
+    from services.dedup_service import rebuild_signatures
+    db.create_all()
+    rebuild_signatures(batch_size=batch_size, log=click.echo)
+
+
+@usage_cli.command('report')
+@click.option('--days', default=7, show_default=True, help="Number of days to include, ending today.")
+@click.option('--top', default=20, show_default=True, help="Number of users to list.")
+@click.option('--by-endpoint', is_flag=True, help="Also break totals down per endpoint.")
+def usage_report(days, top, by_endpoint):
+    """Lists the heaviest LLM users by tokens over recent days."""
+    from datetime import datetime, timedelta
+    from sqlalchemy import func
+    from flask import current_app
+    from models import User, LLMUsage
+
+    db.create_all()
+    since = datetime.utcnow().date() - timedelta(days=days - 1)
+
+    rows = db.session.query(
+        User.id, User.email,
+        func.sum(LLMUsage.calls).label('calls'),
+        func.sum(LLMUsage.prompt_tokens).label('prompt_tokens'),
+        func.sum(LLMUsage.output_tokens).label('output_tokens'),
+        func.sum(LLMUsage.total_tokens).label('total_tokens')
+    ).join(LLMUsage, LLMUsage.user_id == User.id).filter(
+        LLMUsage.day >= since
+    ).group_by(User.id, User.email).order_by(func.sum(LLMUsage.total_tokens).desc()).limit(top).all()
+
+    click.echo(f"LLM usage since {since} (UTC)")
+    # Each web worker writes its counters on its own timer
+    click.echo(f"Calls from the last {current_app.config.get('USAGE_FLUSH_SECONDS', 30)}s may not be included yet.")
+    click.echo(f"{'user':<40} {'calls':>8} {'prompt':>12} {'output':>12} {'total':>12}")
+    for row in rows:
+        click.echo(f"{row.email:<40} {row.calls:>8} {row.prompt_tokens:>12} {row.output_tokens:>12} {row.total_tokens:>12}")
+        if by_endpoint:
+            endpoints = db.session.query(
+                LLMUsage.endpoint, func.sum(LLMUsage.calls), func.sum(LLMUsage.total_tokens)
+            ).filter(LLMUsage.user_id == row.id, LLMUsage.day >= since).group_by(LLMUsage.endpoint).all()
+            for endpoint, calls, tokens in endpoints:
+                click.echo(f"    {endpoint:<36} {calls:>8} {'':>12} {'':>12} {tokens:>12}")
+
+
+@interviews_cli.command('grade-pending')
+@click.option('--stale-minutes', type=int, default=None,
+              help="Minutes since a session's last answer before it counts as abandoned "
+                   "(default: PENDING_ANSWER_STALE_MINUTES).")
+@click.option('--max-attempts', type=int, default=None,
+              help="Drop answers that failed grading this many times (default: PENDING_ANSWER_MAX_ATTEMPTS).")
+def grade_pending(stale_minutes, max_attempts):
+    """
+    Grades queued session-mode answers whose page was closed before
+    "Finish & Grade Session", then drops answers that keep failing.
+    Meant to run periodically, e.g. from cron.
+    """
+    from flask import current_app
+    from services.interview_grading import grade_session, stale_sessions, expire_pending
+
+    db.create_all()
+    config = current_app.config
+    if stale_minutes is None:
+        stale_minutes = config['PENDING_ANSWER_STALE_MINUTES']
+    if max_attempts is None:
+        max_attempts = config['PENDING_ANSWER_MAX_ATTEMPTS']
+
+    graded = failed = 0
+    for user_id, session_token in stale_sessions(stale_minutes):
+        try:
+            results, failures = grade_session(user_id, session_token)
+        except Exception as e:
+            db.session.rollback()
+            click.echo(f"user {user_id} session {session_token}: {e}")
+            continue
+        graded += len(results)
+        failed += len(failures)
+
+    expired = expire_pending(max_attempts)
+    click.echo(f"Graded {graded} answers, {failed} failed, dropped {expired} after {max_attempts} failed attempts.")
+
+
+def register_cli(app):
+    """Registers all CLI command groups on the app."""
+    app.cli.add_command(subjects_cli)
+    app.cli.add_command(items_cli)
+    app.cli.add_command(export_cli)
+    app.cli.add_command(questions_cli)
+    app.cli.add_command(usage_cli)
+    app.cli.add_command(interviews_cli)
@@ -1,4 +1,20 @@
 import os
+import json
+
+def _engine_options(uri):
+    """Connection pool settings for one engine, sized to its database URI."""
+    options = {
+        'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', '1') == '1',
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 280)), # Below MySQL's wait_timeout
+    }
+    # In-memory SQLite uses a single static connection and rejects pool sizing
+    if uri and not uri.startswith('sqlite'):
+        options.update({
+            'pool_size': int(os.getenv('DB_POOL_SIZE', 10)),
+            'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 20)),
+            'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', 30)),
+        })
+    return options
 
 class Config:
     # IMPORTANT: Change this to a real, random secret key in production
@@ -6,4 +22,45 @@ class Config:
     
     # Database URI
     SQLALCHEMY_DATABASE_URI = os.getenv('SQLALCHEMY_DATABASE_URI')
-    SQLALCHEMY_TRACK_MODIFICATIONS = False
\ No newline at end of file
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = _engine_options(SQLALCHEMY_DATABASE_URI)
+
+    # Optional read replica: read-only views query it (see db_routing.py)
+    SQLALCHEMY_REPLICA_URI = os.getenv('SQLALCHEMY_REPLICA_URI')
+    # Bind engines don't use SQLALCHEMY_ENGINE_OPTIONS (that is the primary's),
+    # so the replica's pool options are set here from its own URI
+    SQLALCHEMY_BINDS = {
+        'replica': {'url': SQLALCHEMY_REPLICA_URI, **_engine_options(SQLALCHEMY_REPLICA_URI)}
+    } if SQLALCHEMY_REPLICA_URI else {}
+    # After a write, that user's reads stay on the primary for this long
+    READ_YOUR_WRITES_SECONDS = int(os.getenv('READ_YOUR_WRITES_SECONDS', 10))
+
+    # Comma-separated emails allowed to use the /admin endpoints
+    ADMIN_EMAILS = [e.strip().lower() for e in os.getenv('ADMIN_EMAILS', '').split(',') if e.strip()]
+
+    # Per-user daily LLM quotas (0 = unlimited), see services/usage_service.py
+    LLM_DAILY_CALL_QUOTA = int(os.getenv('LLM_DAILY_CALL_QUOTA', 200))
+    LLM_DAILY_TOKEN_QUOTA = int(os.getenv('LLM_DAILY_TOKEN_QUOTA', 1000000))
+    # Per-endpoint daily call quotas, e.g. '{"study_guide": 20, "tutor_tip": 10}'
+    LLM_ENDPOINT_DAILY_QUOTAS = json.loads(os.getenv('LLM_ENDPOINT_DAILY_QUOTAS', '{"study_guide": 20, "tutor_tip": 10}'))
+    # How often in-memory usage counters are written to the llm_usage table
+    USAGE_FLUSH_SECONDS = int(os.getenv('USAGE_FLUSH_SECONDS', 30))
+
+    # Queued session-mode interview answers (see services/interview_grading.py):
+    # a session with no new answer for this long counts as abandoned, and its
+    # answers move into the user's next session or are graded by
+    # 'flask interviews grade-pending'
+    PENDING_ANSWER_STALE_MINUTES = int(os.getenv('PENDING_ANSWER_STALE_MINUTES', 30))
+    # Answers that failed grading this many times are dropped by that command
+    PENDING_ANSWER_MAX_ATTEMPTS = int(os.getenv('PENDING_ANSWER_MAX_ATTEMPTS', 5))
+
+    # Request profiling, see profiling.py. Off unless a sample rate or token is set.
+    # Share of requests profiled at random, e.g. 0.01
+    PROFILER_SAMPLE_RATE = float(os.getenv('PROFILER_SAMPLE_RATE', 0))
+    # Requests sending this value in the X-Profile-Token header are always profiled
+    PROFILER_TOKEN = os.getenv('PROFILER_TOKEN')
+    PROFILER_DIR = os.getenv('PROFILER_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles'))
+    # Oldest profiles (a .pstats and a .collapsed file each) are deleted beyond this count
+    PROFILER_MAX_PROFILES = int(os.getenv('PROFILER_MAX_PROFILES', 50))
+    # Stack sampling interval in seconds for the collapsed-stack output
+    PROFILER_INTERVAL = float(os.getenv('PROFILER_INTERVAL', 0.005))
@@ -0,0 +1,48 @@
+import time
+from functools import wraps
+from flask import g, session, request, current_app, has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy.sql import Select
+
+REPLICA_BIND = 'replica'
+
+
+class RoutingSession(Session):
+    """
+    Sends SELECTs to the read replica while a view decorated with
+    @replica_reads is running; everything else (writes, flushes, reads
+    outside those views) stays on the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None
+                and not self._flushing
+                and isinstance(clause, Select)
+                and has_request_context()
+                and g.get('use_replica')):
+            engine = self._db.engines.get(REPLICA_BIND)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def mark_primary_reads():
+    """
+    Pins this client's reads to the primary for READ_YOUR_WRITES_SECONDS,
+    so a user sees their own write even if the replica lags behind.
+    """
+    window = current_app.config.get('READ_YOUR_WRITES_SECONDS', 0)
+    if window:
+        session['primary_reads_until'] = time.time() + window
+
+
+def replica_reads(view):
+    """Routes the view's GET queries to the read replica (if one is configured)."""
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        g.use_replica = (
+            request.method == 'GET'
+            and session.get('primary_reads_until', 0) < time.time()
+        )
+        return view(*args, **kwargs)
+    return wrapped
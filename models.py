@@ -24,6 +24,7 @@ class QuizResult(db.Model):
     """QuizResult model for storing user's quiz scores."""
     id = db.Column(db.Integer, primary_key=True)
     subject = db.Column(db.String(150), nullable=False)
+    subject_id = db.Column(db.String(64), index=True) # Canonical subject ID (see services/subject_service.py)
     score = db.Column(db.Integer, nullable=False)
     total = db.Column(db.Integer, nullable=False)
     level = db.Column(db.String(50))
@@ -38,6 +39,7 @@ class InterviewResult(db.Model):
     """Stores results from mock interviews."""
     id = db.Column(db.Integer, primary_key=True)
     subject = db.Column(db.String(150), nullable=False)
+    subject_id = db.Column(db.String(64), index=True) # Canonical subject ID (see services/subject_service.py)
     level = db.Column(db.String(50))
     question_text = db.Column(db.Text, nullable=False)
     user_answer = db.Column(db.Text)
@@ -45,3 +47,103 @@ class InterviewResult(db.Model):
     ai_score = db.Column(db.Integer)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+
+
+class QuestionStat(db.Model):
+    """Item-analysis statistics for a question, aggregated over quiz attempts."""
+    id = db.Column(db.Integer, primary_key=True)
+    question_hash = db.Column(db.String(40), unique=True, nullable=False)
+    subject_id = db.Column(db.String(64), index=True)
+    question_text = db.Column(db.Text, nullable=False)
+
+    # Sufficient statistics, so new attempts can be merged incrementally.
+    # x = 1 if answered correctly, y = rest-of-quiz score fraction.
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    sum_x = db.Column(db.Float, default=0, nullable=False)
+    sum_y = db.Column(db.Float, default=0, nullable=False)
+    sum_yy = db.Column(db.Float, default=0, nullable=False)
+    sum_xy = db.Column(db.Float, default=0, nullable=False)
+    option_counts_json = db.Column(db.Text) # Choice counts for [A, B, C, D, No Answer]
+    option_score_sums_json = db.Column(db.Text) # Sum of y for choosers of each option
+
+    # Derived statistics
+    difficulty = db.Column(db.Float) # Proportion correct (p-value)
+    discrimination = db.Column(db.Float) # Point-biserial correlation with rest score
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class ItemAnalysisRun(db.Model):
+    """Watermark log for incremental item-analysis runs."""
+    id = db.Column(db.Integer, primary_key=True)
+    last_result_id = db.Column(db.Integer, nullable=False)
+    results_processed = db.Column(db.Integer, default=0)
+    responses_processed = db.Column(db.Integer, default=0)
+    finished_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class Question(db.Model):
+    """Deduplicated store of generated and imported quiz questions."""
+    id = db.Column(db.Integer, primary_key=True)
+    question_hash = db.Column(db.String(40), unique=True, nullable=False)
+    subject_id = db.Column(db.String(64), index=True)
+    level = db.Column(db.String(50))
+    question = db.Column(db.Text, nullable=False)
+    option_a = db.Column(db.Text, nullable=False)
+    option_b = db.Column(db.Text, nullable=False)
+    option_c = db.Column(db.Text, nullable=False)
+    option_d = db.Column(db.Text, nullable=False)
+    correct_answer_letter = db.Column(db.String(1), nullable=False)
+    source = db.Column(db.String(20), default='generated') # 'generated' or 'import'
+    times_seen = db.Column(db.Integer, default=1) # Near-duplicates merged into this question
+    signature_json = db.Column(db.Text) # MinHash signature of the question text
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    bands = db.relationship('QuestionBand', backref='question', cascade='all, delete-orphan')
+
+    def to_quiz_dict(self, question_id):
+        """Returns the question in the format used by test.html and quiz_data_json."""
+        return {
+            "id": question_id,
+            "question": self.question,
+            "option_a": self.option_a,
+            "option_b": self.option_b,
+            "option_c": self.option_c,
+            "option_d": self.option_d,
+            "correct_answer_letter": self.correct_answer_letter
+        }
+
+class QuestionBand(db.Model):
+    """Locality-sensitive hashing band index over Question signatures."""
+    id = db.Column(db.Integer, primary_key=True)
+    band_key = db.Column(db.String(24), index=True, nullable=False)
+    question_id = db.Column(db.Integer, db.ForeignKey('question.id'), nullable=False)
+
+class DataVersion(db.Model):
+    """Version counters bumped on writes, used to stamp page ETags."""
+    key = db.Column(db.String(64), primary_key=True) # e.g. 'leaderboard', 'user:42'
+    version = db.Column(db.Integer, default=0, nullable=False)
+
+class PendingAnswer(db.Model):
+    """Written interview answers queued for end-of-session grading."""
+    id = db.Column(db.Integer, primary_key=True)
+    session_token = db.Column(db.String(32), index=True, nullable=False)
+    subject = db.Column(db.String(150), nullable=False)
+    subject_id = db.Column(db.String(64))
+    level = db.Column(db.String(50))
+    question_text = db.Column(db.Text, nullable=False)
+    user_answer = db.Column(db.Text)
+    attempts = db.Column(db.Integer, default=0) # Grading attempts that failed for this answer
+    last_error = db.Column(db.Text)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+
+class LLMUsage(db.Model):
+    """Daily model-call and token totals per user and endpoint."""
+    __table_args__ = (db.UniqueConstraint('user_id', 'endpoint', 'day'),)
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    endpoint = db.Column(db.String(50), nullable=False)
+    day = db.Column(db.Date, nullable=False, index=True)
+    calls = db.Column(db.Integer, default=0, nullable=False)
+    prompt_tokens = db.Column(db.Integer, default=0, nullable=False)
+    output_tokens = db.Column(db.Integer, default=0, nullable=False)
+    total_tokens = db.Column(db.Integer, default=0, nullable=False)
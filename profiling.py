@@ -0,0 +1,172 @@
+import cProfile
+import hmac
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from flask import g, request
+
+PROFILE_HEADER = 'X-Profile-Token'
+PROFILE_EXTENSIONS = ('.pstats', '.collapsed')
+
+# One profiled request per process at a time: cProfile can't run two
+# profilers at once on Python 3.12+ (sys.monitoring), and overlapping
+# profiles would mix each other's frames
+_profile_lock = threading.Lock()
+
+
+class StackSampler:
+    """
+    Samples one thread's Python stack every `interval` seconds and counts
+    identical stacks, for flame graphs in collapsed-stack format.
+    """
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class RequestProfile:
+    """cProfile plus a stack sampler around a single request."""
+
+    def __init__(self, label, interval):
+        slug = re.sub(r'[^A-Za-z0-9]+', '-', label).strip('-')[:60] or 'root'
+        self.profile_id = f"{datetime.utcnow():%Y%m%d-%H%M%S-%f}_{slug}"
+        self.started = time.perf_counter()
+        self.profiler = cProfile.Profile()
+        self.sampler = StackSampler(threading.get_ident(), interval)
+
+    def start(self):
+        self.sampler.start()
+        try:
+            self.profiler.enable()
+        except ValueError as e:
+            # Another profiler or debugger is already active in this process
+            self.sampler.stop()
+            print(f"Error starting request profile: {e}")
+            return False
+        return True
+
+    def stop(self):
+        self.profiler.disable()
+        self.sampler.stop()
+        return (time.perf_counter() - self.started) * 1000
+
+    def save(self, directory, elapsed_ms):
+        """Writes <profile_id>_<ms>ms.pstats and .collapsed; returns the base name."""
+        os.makedirs(directory, exist_ok=True)
+        name = f"{self.profile_id}_{elapsed_ms:.0f}ms"
+        self.profiler.dump_stats(os.path.join(directory, name + '.pstats'))
+        with open(os.path.join(directory, name + '.collapsed'), 'w') as f:
+            f.write(self.sampler.collapsed())
+        return name
+
+
+def list_profiles(directory):
+    """Profile files in the directory, newest first."""
+    if not os.path.isdir(directory):
+        return []
+    entries = [e for e in os.scandir(directory) if e.is_file() and e.name.endswith(PROFILE_EXTENSIONS)]
+    entries.sort(key=lambda e: e.stat().st_mtime, reverse=True)
+    return entries
+
+
+def rotate_profiles(directory, max_profiles):
+    """Deletes the files of the oldest profiles beyond max_profiles."""
+    kept = set()
+    for entry in list_profiles(directory):
+        name = os.path.splitext(entry.name)[0]
+        if name in kept or len(kept) < max_profiles:
+            kept.add(name)
+            continue
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
+
+
+def init_profiler(app):
+    """
+    Profiles a random PROFILER_SAMPLE_RATE share of requests, and any request
+    carrying the X-Profile-Token header that matches PROFILER_TOKEN.
+    When neither is configured no hooks are registered at all. A request
+    that arrives while another one is being profiled is not profiled.
+    """
+    sample_rate = app.config.get('PROFILER_SAMPLE_RATE', 0)
+    token = app.config.get('PROFILER_TOKEN')
+    if not sample_rate and not token:
+        return
+
+    directory = app.config['PROFILER_DIR']
+    interval = app.config.get('PROFILER_INTERVAL', 0.005)
+    max_profiles = app.config.get('PROFILER_MAX_PROFILES', 50)
+
+    @app.before_request
+    def start_profile():
+        header = request.headers.get(PROFILE_HEADER)
+        requested = bool(token and header and hmac.compare_digest(header, token))
+        if not (requested or (sample_rate and random.random() < sample_rate)):
+            return
+        if not _profile_lock.acquire(blocking=False):
+            return
+        profile = RequestProfile(f"{request.method} {request.path}", interval)
+        if profile.start():
+            g.request_profile = profile
+        else:
+            _profile_lock.release()
+
+    @app.after_request
+    def stop_profile_on_close(response):
+        profile = g.pop('request_profile', None)
+        if profile is not None:
+            # Stopped once the body has been sent, so streamed responses are covered
+            response.headers['X-Profile-Id'] = profile.profile_id
+            response.call_on_close(lambda: _finish(profile, directory, max_profiles))
+        return response
+
+    @app.teardown_request
+    def discard_profile(exc):
+        # Only left in g if after_request did not run
+        profile = g.pop('request_profile', None)
+        if profile is not None:
+            profile.stop()
+            _profile_lock.release()
+
+
+def _finish(profile, directory, max_profiles):
+    try:
+        elapsed_ms = profile.stop()
+        profile.save(directory, elapsed_ms)
+        rotate_profiles(directory, max_profiles)
+    except OSError as e:
+        print(f"Error saving request profile: {e}")
+    finally:
+        _profile_lock.release()
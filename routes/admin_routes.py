@@ -0,0 +1,74 @@
+from datetime import datetime
+from functools import wraps
+from flask import (Blueprint, request, jsonify, current_app, Response, stream_with_context,
+                   send_from_directory, url_for)
+from flask_login import login_required, current_user
+from services.export_service import stream_export, parse_date
+from db_routing import replica_reads
+import profiling
+
+admin = Blueprint('admin', __name__, url_prefix='/admin')
+
+def admin_required(view):
+    """Restricts a view to users listed in ADMIN_EMAILS."""
+    @wraps(view)
+    @login_required
+    def wrapped(*args, **kwargs):
+        if current_user.email.lower() not in current_app.config.get('ADMIN_EMAILS', []):
+            return jsonify({"error": "Admin access required"}), 403
+        return view(*args, **kwargs)
+    return wrapped
+
+@admin.route("/export/<kind>")
+@admin_required
+@replica_reads
+def export_results(kind):
+    """
+    Streams quiz or interview results as CSV or JSON Lines.
+    e.g. /admin/export/quiz?format=csv&start=2025-01-01&end=2025-03-31&subject=OS&users=a@x.com,b@x.com
+    """
+    fmt = request.args.get('format', 'csv')
+    users = [u.strip() for u in request.args.get('users', '').split(',') if u.strip()]
+
+    try:
+        chunks = stream_export(
+            kind, fmt,
+            start=parse_date(request.args.get('start')),
+            end=parse_date(request.args.get('end')),
+            subject=request.args.get('subject'),
+            users=users or None,
+            include_answers=request.args.get('include_answers') == '1'
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    filename = f"{kind}_results.{fmt}"
+    return Response(
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+@admin.route("/profiles")
+@admin_required
+def list_profiles():
+    """Lists saved request profiles, newest first."""
+    entries = profiling.list_profiles(current_app.config['PROFILER_DIR'])
+    return jsonify([
+        {
+            "name": entry.name,
+            "size": entry.stat().st_size,
+            "modified": datetime.utcfromtimestamp(entry.stat().st_mtime).isoformat(),
+            "url": url_for('admin.download_profile', name=entry.name)
+        }
+        for entry in entries
+    ])
+
+@admin.route("/profiles/<name>")
+@admin_required
+def download_profile(name):
+    """Downloads one .pstats or .collapsed profile file."""
+    if not name.endswith(profiling.PROFILE_EXTENSIONS):
+        return jsonify({"error": "Unknown profile file"}), 404
+    return send_from_directory(current_app.config['PROFILER_DIR'], name, as_attachment=True)
@@ -2,6 +2,7 @@ from flask import Blueprint, request, redirect, url_for, flash, render_template
 from flask_login import login_user, logout_user, login_required, current_user
 from models import User
 from extensions import db
+from db_routing import mark_primary_reads
 
 auth = Blueprint('auth', __name__)
 
@@ -43,6 +44,7 @@ def register():
             new_user.set_password(password)
             db.session.add(new_user)
             db.session.commit()
+            mark_primary_reads()
             
             login_user(new_user) # Log them in immediately
             flash('Account created successfully!', 'success')
@@ -1,28 +1,63 @@
-from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify
+from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify, current_app
 from flask_login import login_required, current_user
 import json
+import uuid
 from google.generativeai.types import GenerationConfig
-from models import InterviewResult
+from models import InterviewResult, PendingAnswer
 from extensions import db
-from services.gemini_service import model, interview_grade_schema
+from services.gemini_service import model, interview_grade_schema, build_interview_question_prompt, build_grade_prompt
+from services.subject_service import canonicalize_subject
+from services.page_cache import bump_version, user_key
+from db_routing import mark_primary_reads
+from services.interview_grading import grade_session, adopt_stale_answers
+from services.usage_service import metered, quota_required
 
 interview = Blueprint('interview', __name__)
 
+GRADING_MODES = ('instant', 'session')
+
 @interview.route("/interview")
 @login_required
 def interview_page():
     """Renders the mock interview page."""
     subject = request.args.get('subject')
     level = request.args.get('level')
+    # 'instant' grades each answer on submit, 'session' grades written answers at the end
+    grading = request.args.get('grading')
+    if grading not in GRADING_MODES:
+        grading = 'instant'
     
     if not subject or not level:
         flash('Subject and level are required to start an interview.', 'danger')
         return redirect(url_for('main.dashboard'))
-        
-    return render_template("interview.html", subject=subject, level=level)
+
+    _, subject = canonicalize_subject(subject)
+
+    # Answers left queued by an earlier session page that was closed before
+    # grading are carried into this session and graded when it finishes
+    session_token = uuid.uuid4().hex
+    carried_over = 0
+    if grading == 'session':
+        try:
+            carried_over = adopt_stale_answers(
+                current_user.id, session_token, current_app.config['PENDING_ANSWER_STALE_MINUTES']
+            )
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error carrying over queued interview answers: {e}")
+        
+    return render_template(
+        "interview.html",
+        subject=subject,
+        level=level,
+        grading=grading,
+        session_token=session_token,
+        carried_over=carried_over
+    )
 
 @interview.route("/api/get-interview-question", methods=["POST"])
 @login_required
+@quota_required('interview_question')
 def api_get_interview_question():
     """API endpoint to get a single interview question from Gemini."""
     if not model:
@@ -30,13 +65,8 @@ def api_get_interview_question():
         
     try:
         data = request.json
-        prompt = f"""
-        You are an expert interviewer. 
-        Generate one concise, open-ended interview question for a candidate 
-        at a "{data.get('level')}" level on the topic of "{data.get('subject')}".
-        Do not add any preamble, just return the question text.
-        """
-        response = model.generate_content(prompt)
+        prompt = build_interview_question_prompt(data.get('subject'), data.get('level'))
+        response = metered('interview_question', model.generate_content, prompt)
         return jsonify({"question": response.text})
         
     except Exception as e:
@@ -47,6 +77,7 @@ def api_get_interview_question():
 
 @interview.route("/api/grade-answer", methods=["POST"])
 @login_required
+@quota_required('grade_answer')
 def api_grade_answer():
     """API endpoint to grade a user's interview answer."""
     if not model:
@@ -54,40 +85,20 @@ def api_grade_answer():
         
     try:
         data = request.json
+        subject_id, subject = canonicalize_subject(data.get('subject'))
         
-        prompt = f"""
-        You are an expert tech interviewer. A candidate was asked the following question
-        on the topic of "{data.get('subject')}" at a "{data.get('level')}" level:
-        "{data.get('question')}"
-
-        The candidate provided this answer:
-        "{data.get('user_answer')}"
-
-        Please grade their answer. Provide a score from 1 (poor) to 5 (excellent)
-        and concise, constructive feedback on their answer's accuracy and completeness.
-        Adhere *strictly* to the JSON schema.
-        """
+        prompt = build_grade_prompt(subject, data.get('level'), data.get('question'), data.get('user_answer'))
         
         generation_config = GenerationConfig(
             response_mime_type="application/json",
             response_schema=interview_grade_schema
         )
         
-        response = model.generate_content(prompt, generation_config=generation_config)
+        response = metered('grade_answer', model.generate_content, prompt, generation_config=generation_config)
         grade_data = json.loads(response.text) # { "score": 4, "feedback": "..." }
         
         # Save to database
-        new_interview = InterviewResult(
-            subject=data.get('subject'),
-            level=data.get('level'),
-            question_text=data.get('question'),
-            user_answer=data.get('user_answer'),
-            ai_feedback=grade_data.get('feedback'),
-            ai_score=grade_data.get('score'),
-            user_id=current_user.id
-        )
-        db.session.add(new_interview)
-        db.session.commit()
+        save_interview_grade(subject_id, subject, data, grade_data)
         
         return jsonify(grade_data)
 
@@ -95,8 +106,26 @@ def api_grade_answer():
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
 
+def save_interview_grade(subject_id, subject, data, grade_data):
+    """Stores a graded written answer."""
+    new_interview = InterviewResult(
+        subject=subject,
+        subject_id=subject_id,
+        level=data.get('level'),
+        question_text=data.get('question'),
+        user_answer=data.get('user_answer'),
+        ai_feedback=grade_data.get('feedback'),
+        ai_score=grade_data.get('score'),
+        user_id=current_user.id
+    )
+    db.session.add(new_interview)
+    db.session.commit()
+    bump_version(user_key(current_user.id))
+    mark_primary_reads()
+
 @interview.route("/api/grade-video", methods=["POST"])
 @login_required
+@quota_required('grade_video')
 def api_grade_video():
     """API endpoint to grade a video interview answer."""
     import os
@@ -125,7 +154,7 @@ def api_grade_video():
         video_file.save(temp_path)
         
         # 3. Get metadata from form
-        subject = request.form.get('subject')
+        subject_id, subject = canonicalize_subject(request.form.get('subject'))
         level = request.form.get('level')
         question = request.form.get('question')
         
@@ -144,6 +173,7 @@ def api_grade_video():
         
         new_interview = InterviewResult(
             subject=subject,
+            subject_id=subject_id,
             level=level,
             question_text=question,
             user_answer="[Video Submission]", 
@@ -153,6 +183,8 @@ def api_grade_video():
         )
         db.session.add(new_interview)
         db.session.commit()
+        bump_version(user_key(current_user.id))
+        mark_primary_reads()
         
         return jsonify({
             "score": result_data.get('score'),
@@ -162,3 +194,53 @@ def api_grade_video():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@interview.route("/api/interview-session/answer", methods=["POST"])
+@login_required
+def api_queue_answer():
+    """Queues a written answer for end-of-session grading."""
+    try:
+        data = request.json
+        if not data.get('session_token') or not data.get('question'):
+            return jsonify({"error": "session_token and question are required"}), 400
+
+        subject_id, subject = canonicalize_subject(data.get('subject'))
+        db.session.add(PendingAnswer(
+            session_token=data.get('session_token'),
+            subject=subject,
+            subject_id=subject_id,
+            level=data.get('level'),
+            question_text=data.get('question'),
+            user_answer=data.get('user_answer'),
+            user_id=current_user.id
+        ))
+        db.session.commit()
+
+        pending = PendingAnswer.query.filter_by(
+            user_id=current_user.id, session_token=data.get('session_token')
+        ).count()
+        return jsonify({"queued": True, "pending": pending})
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+@interview.route("/api/interview-session/grade", methods=["POST"])
+@login_required
+@quota_required('grade_session')
+def api_grade_session():
+    """Grades all queued answers of a session in batched calls."""
+    if not model:
+        return jsonify({"error": "Model not initialized"}), 500
+
+    try:
+        session_token = (request.json or {}).get('session_token')
+        if not session_token:
+            return jsonify({"error": "session_token is required"}), 400
+
+        results, failed = grade_session(current_user.id, session_token)
+        mark_primary_reads()
+        return jsonify({"results": results, "failed": failed})
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
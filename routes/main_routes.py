@@ -4,12 +4,17 @@ from sqlalchemy import func, case
 from models import User, QuizResult, InterviewResult
 from extensions import db
 from services.gemini_service import model
+from db_routing import replica_reads, mark_primary_reads
+from services.usage_service import metered
+from services.page_cache import (fragment_cache, template_version, get_version, bump_version, user_key,
+                                 LEADERBOARD_KEY, is_not_modified, not_modified, etag_response)
 
 main = Blueprint('main', __name__)
 
 @main.route("/")
 @main.route("/dashboard")
 @login_required
+@replica_reads
 def dashboard():
     """Renders the main dashboard page with a personalized AI tutor tip."""
     
@@ -22,25 +27,30 @@ def dashboard():
         if results:
             subject_scores = {}
             subject_counts = {}
+            subject_names = {}
             
+            # Grouped by canonical subject ID so spelling variants count together
             for r in results:
-                if r.subject not in subject_scores:
-                    subject_scores[r.subject] = 0
-                    subject_counts[r.subject] = 0
+                key = r.subject_id or r.subject
+                if key not in subject_scores:
+                    subject_scores[key] = 0
+                    subject_counts[key] = 0
+                    subject_names[key] = r.subject
                 if r.total > 0:
-                    subject_scores[r.subject] += (r.score / r.total)
-                    subject_counts[r.subject] += 1
+                    subject_scores[key] += (r.score / r.total)
+                    subject_counts[key] += 1
             
             # Calculate average for each subject
             subject_averages = {}
-            for subject, total_score in subject_scores.items():
-                if subject_counts[subject] > 0:
-                    subject_averages[subject] = (total_score / subject_counts[subject]) * 100
+            for key, total_score in subject_scores.items():
+                if subject_counts[key] > 0:
+                    subject_averages[key] = (total_score / subject_counts[key]) * 100
             
             # Find weakest subject
             if subject_averages:
-                weakest_subject = min(subject_averages, key=subject_averages.get)
-                weakest_score = subject_averages[weakest_subject]
+                weakest_key = min(subject_averages, key=subject_averages.get)
+                weakest_subject = subject_names[weakest_key]
+                weakest_score = subject_averages[weakest_key]
                 
                 if weakest_score < 70: # Only give tip if score is below 70%
                     if model:
@@ -50,7 +60,7 @@ def dashboard():
                         Give them one short (2-3 sentence) piece of encouragement and suggest *one* specific action from this list to improve: ['Take a Beginner quiz', 'Get a Study Guide', 'Try a Mock Interview'].
                         Be friendly and concise.
                         """
-                        response = model.generate_content(prompt)
+                        response = metered('tutor_tip', model.generate_content, prompt)
                         ai_tutor_tip = response.text
                     else:
                          ai_tutor_tip = "Keep practicing to improve your scores!"
@@ -64,6 +74,7 @@ def dashboard():
 
 @main.route("/profile", methods=["GET", "POST"])
 @login_required
+@replica_reads
 def profile():
     """Renders the profile page and handles updates."""
     
@@ -72,10 +83,18 @@ def profile():
         display_name = request.form.get('displayName') 
         current_user.display_name = display_name
         db.session.commit()
+        bump_version(user_key(current_user.id), LEADERBOARD_KEY)
+        mark_primary_reads()
         flash('Profile updated successfully!', 'success')
         return redirect(url_for('main.profile'))
 
     # --- GET Request: Prepare all data for the profile page ---
+
+    # The version is bumped by every write that shows up on this page
+    tmpl = template_version("profile.html")
+    etag = f"profile-{current_user.id}-{get_version(user_key(current_user.id))}-{tmpl}"
+    if is_not_modified(etag):
+        return not_modified(etag)
     
     display_name = current_user.display_name
     if not display_name:
@@ -108,7 +127,7 @@ def profile():
         # Use a generator expression to avoid errors on empty list
         best_score_percent = max(((r.score / r.total) * 100) for r in all_quiz_results if r.total > 0)
         
-    subjects_attempted = len(set(r.subject for r in all_quiz_results))
+    subjects_attempted = len(set(r.subject_id or r.subject for r in all_quiz_results))
 
     stats_overview = {
         "total_tests": total_tests,
@@ -117,12 +136,14 @@ def profile():
         "subjects_attempted": subjects_attempted
     }
 
+    # Grouped by canonical subject ID; rows not yet backfilled fall back to their raw subject
+    subject_key = func.coalesce(QuizResult.subject_id, QuizResult.subject)
     subject_stats_query = db.session.query(
-        QuizResult.subject,
+        func.max(QuizResult.subject).label('subject'),
         func.count(QuizResult.id).label('test_count'),
         func.avg(case((QuizResult.total > 0, (QuizResult.score / QuizResult.total) * 100), else_=0)).label('avg_score'),
         func.max(case((QuizResult.total > 0, (QuizResult.score / QuizResult.total) * 100), else_=0)).label('best_score')
-    ).filter_by(user_id=current_user.id).group_by(QuizResult.subject).all()
+    ).filter_by(user_id=current_user.id).group_by(subject_key).all()
 
     subject_stats_list = []
     for stat in subject_stats_query:
@@ -137,7 +158,7 @@ def profile():
     interview_history = current_user.interview_results.order_by(InterviewResult.timestamp.desc()).all()
 
     # 5. Pass all data to the template
-    return render_template(
+    html = render_template(
         "profile.html", 
         user_info=user_info_tuple,           
         test_history=test_history_list,      
@@ -145,6 +166,7 @@ def profile():
         subject_stats=subject_stats_list,    
         interview_history=interview_history
     )
+    return etag_response(html, etag)
 
 
 @main.route("/explore")
@@ -156,8 +178,20 @@ def explore():
 
 @main.route("/leaderboard")
 @login_required
+@replica_reads
 def leaderboard():
     """Renders the global leaderboard page."""
+
+    # Bumped on every quiz submission and display name change
+    tmpl = template_version("leaderboard.html")
+    version = get_version(LEADERBOARD_KEY)
+    etag = f"leaderboard-{version}-{tmpl}"
+    if is_not_modified(etag):
+        return not_modified(etag)
+
+    cached = fragment_cache.get(('leaderboard', version, tmpl))
+    if cached is not None:
+        return etag_response(cached, etag)
     
     avg_score_calc = func.avg(
         case(
@@ -180,4 +214,6 @@ def leaderboard():
         avg_score_calc.desc()
     ).limit(20).all()
 
-    return render_template("leaderboard.html", leaderboard_data=leaderboard_data)
+    html = render_template("leaderboard.html", leaderboard_data=leaderboard_data)
+    fragment_cache.set(('leaderboard', version, tmpl), html)
+    return etag_response(html, etag)
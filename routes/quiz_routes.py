@@ -1,12 +1,22 @@
-from flask import Blueprint, render_template, request, flash, redirect, url_for, session, jsonify
+from flask import Blueprint, render_template, request, flash, redirect, url_for, session, jsonify, abort
 from flask_login import login_required, current_user
 import json
 from models import QuizResult
 from extensions import db
-from services.gemini_service import generate_quiz_from_gemini, model
+from services.gemini_service import generate_quiz_from_gemini, model, build_explain_prompt, build_study_guide_prompt
+from services.subject_service import canonicalize_subject
+from db_routing import mark_primary_reads
+from services.usage_service import metered, quota_required, check_quota, QuotaExceeded
+from services.item_analysis import flagged_questions
+from services.dedup_service import register_questions
+from services.page_cache import (fragment_cache, template_version, bump_version, user_key,
+                                 LEADERBOARD_KEY, is_not_modified, not_modified, etag_response)
 
 quiz = Blueprint('quiz', __name__)
 
+# Questions per generated quiz
+QUIZ_LENGTH = 10
+
 @quiz.route("/test")
 @login_required
 def test():
@@ -21,12 +31,34 @@ def test():
         flash('Subject and level are required to start a test.', 'danger')
         return redirect(url_for('main.dashboard'))
 
-    # 2. Generate new questions from Gemini
-    questions = generate_quiz_from_gemini(subject, level, num_questions=10)
+    try:
+        check_quota('quiz')
+    except QuotaExceeded as e:
+        flash(str(e), 'danger')
+        return redirect(url_for('main.dashboard'))
+
+    # Map spelling variants ("OS", "operating system ") onto one canonical subject
+    subject_id, subject = canonicalize_subject(subject)
+
+    # 2. Generate new questions from Gemini, steering away from flagged items
+    avoid_questions = [stat.question_text for stat in flagged_questions(subject_id)]
+    questions = generate_quiz_from_gemini(subject, level, num_questions=QUIZ_LENGTH, avoid_questions=avoid_questions)
+
+    return start_quiz(subject_id, subject, level, questions)
+
+def start_quiz(subject_id, subject, level, questions):
+    """
+    Stores freshly generated questions and renders the test page.
+    """
+    # Drop near-duplicate questions, record new ones in the question store
+    # and top the quiz back up from the store if any were dropped
+    if not any(q.get('error') for q in questions):
+        questions = register_questions(questions, subject_id, level, num_questions=QUIZ_LENGTH)
     
     # 3. Store the quiz (questions and answers) in the user's session
     session['current_quiz'] = questions
     session['quiz_subject'] = subject
+    session['quiz_subject_id'] = subject_id
     session['quiz_level'] = level
     
     # 4. Pass the questions to your existing 'test.html' template
@@ -47,6 +79,7 @@ def submit_test():
     user_answers_from_form = request.form
     questions = session.get('current_quiz')
     subject = session.get('quiz_subject', 'Unknown')
+    subject_id = session.get('quiz_subject_id')
     level = session.get('quiz_level', 'Unknown')
     
     if not questions:
@@ -75,6 +108,7 @@ def submit_test():
     try:
         new_result = QuizResult(
             subject=subject,
+            subject_id=subject_id,
             level=level,
             score=score,
             total=total,
@@ -84,12 +118,16 @@ def submit_test():
         )
         db.session.add(new_result)
         db.session.commit()
+        bump_version(user_key(current_user.id), LEADERBOARD_KEY)
+        mark_primary_reads()
     except Exception as e:
         db.session.rollback()
         flash(f'Error saving your result: {e}', 'danger')
+        return redirect(url_for('main.dashboard'))
 
     session.pop('current_quiz', None)
     session.pop('quiz_subject', None)
+    session.pop('quiz_subject_id', None)
     session.pop('quiz_level', None)
     
     return redirect(url_for('quiz.result', result_id=new_result.id))
@@ -102,16 +140,34 @@ def result(result_id):
     Shows the result for a specific test.
     This also powers the "Review Your Mistakes" page.
     """
-    result = QuizResult.query.get_or_404(result_id)
-    
-    if result.user_id != current_user.id:
+    # A result never changes after submit_test, so its ETag only depends on
+    # the result, the viewer and the template version
+    tmpl = template_version("result.html")
+    etag = f"result-{result_id}-{current_user.id}-{tmpl}"
+    cached = fragment_cache.get(('result', result_id, tmpl))
+
+    # Ownership is checked before any 304: from the cached (user_id, html)
+    # pair, or with a user_id-only lookup
+    if cached is not None:
+        owner_id = cached[0]
+    else:
+        owner_id = db.session.query(QuizResult.user_id).filter_by(id=result_id).scalar()
+        if owner_id is None:
+            abort(404)
+    if owner_id != current_user.id:
         flash('You are not authorized to view this result.', 'danger')
         return redirect(url_for('main.dashboard'))
-        
+
+    if is_not_modified(etag):
+        return not_modified(etag)
+    if cached is not None:
+        return etag_response(cached[1], etag)
+
+    result = QuizResult.query.get_or_404(result_id)
     questions = json.loads(result.quiz_data_json)
     user_answers = json.loads(result.user_answers_json)
     
-    return render_template(
+    html = render_template(
         "result.html",
         subject=result.subject,
         level=result.level,
@@ -120,9 +176,12 @@ def result(result_id):
         questions=questions,
         user_answers=user_answers
     )
+    fragment_cache.set(('result', result_id, tmpl), (result.user_id, html))
+    return etag_response(html, etag)
 
 @quiz.route("/api/explain", methods=["POST"])
 @login_required
+@quota_required('explain')
 def api_explain():
     """API endpoint for the 'Why was I wrong?' feature."""
     if not model:
@@ -130,16 +189,8 @@ def api_explain():
         
     try:
         data = request.json
-        prompt = f"""
-        You are a helpful tutor. My student was answering a quiz question.
-        The question was: "{data.get('question')}"
-        They answered: "{data.get('user_answer')}"
-        The correct answer is: "{data.get('correct_answer')}"
-
-        Please provide a concise, friendly explanation (2-3 sentences)
-        about why their answer was incorrect and why the correct answer is correct.
-        """
-        response = model.generate_content(prompt)
+        prompt = build_explain_prompt(data.get('question'), data.get('user_answer'), data.get('correct_answer'))
+        response = metered('explain', model.generate_content, prompt)
         return jsonify({"explanation": response.text})
         
     except Exception as e:
@@ -147,6 +198,7 @@ def api_explain():
 
 @quiz.route("/api/study-guide", methods=["POST"])
 @login_required
+@quota_required('study_guide')
 def api_study_guide():
     """API endpoint to generate a study guide."""
     if not model:
@@ -154,16 +206,11 @@ def api_study_guide():
         
     try:
         data = request.json
-        subject = data.get('subject')
+        _, subject = canonicalize_subject(data.get('subject'))
         level = data.get('level', 'Intermediate') # Default to Intermediate if not provided
 
-        prompt = f"""
-        You are an expert tutor. Generate a concise study guide
-        for the topic "{subject}" at a "{level}" level.
-        The guide should be able to help a student who has never taken this course and be able to study for this subject with the hlp of study guide provided by you.
-        Suggest key topics and subtopics to cover in the study guide. Also, Suggest youtube videos and website links to cover in the study guide.
-        """
-        response = model.generate_content(prompt)
+        prompt = build_study_guide_prompt(subject, level)
+        response = metered('study_guide', model.generate_content, prompt)
         return jsonify({"guide": response.text})
         
     except Exception as e:
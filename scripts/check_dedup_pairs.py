@@ -0,0 +1,72 @@
+"""
+Regression examples for near-duplicate question detection (services/dedup_service.py).
+
+Each pair is checked the way register_questions decides a merge: the
+pair must be an LSH candidate (share a band), its shingle similarity
+must reach SIMILARITY_THRESHOLD, and the correct option text must match.
+Run from the repo root after changing the shingling or the threshold:
+
+    python scripts/check_dedup_pairs.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.dedup_service import minhash, band_keys, similarity, same_answer, SIMILARITY_THRESHOLD
+
+
+def q(text, correct):
+    """Question dict with the correct option in A (the other options don't matter here)."""
+    return {"question": text, "option_a": correct, "option_b": "-", "option_c": "-", "option_d": "-",
+            "correct_answer_letter": "A"}
+
+
+# Rewordings of the same question: must merge
+DUPLICATES = [
+    (q("What does OS stand for?", "Operating System"),
+     q("What does the acronym OS stand for?", "Operating System")),
+    (q("What is a deadlock in operating systems?", "Processes waiting on each other forever"),
+     q("What is a deadlock in an operating system?", "Processes waiting on each other forever")),
+    (q("Which data structure uses FIFO order?", "Queue"),
+     q("Which data structure follows FIFO order?", "Queue")),
+    (q("Which of the following is a deadlock prevention technique?", "Resource ordering"),
+     q("Which one of these is a deadlock prevention technique?", "Resource ordering")),
+    (q("What is the time complexity of binary search?", "O(log n)"),
+     q("What's the time complexity of a binary search?", "O(log n)")),
+]
+
+# Similar wording, different question: must not merge
+DISTINCT = [
+    (q("What is the default port for HTTP?", "80"),
+     q("What is the default port for HTTPS?", "443")),
+    (q("Which of the following is NOT an operating system?", "Oracle"),
+     q("Which of the following is an operating system?", "Linux")),
+    (q("What is the time complexity of binary search?", "O(log n)"),
+     q("What is the space complexity of binary search?", "O(1)")),
+    (q("Which scheduling algorithm can cause starvation?", "Shortest Job First"),
+     q("Which scheduling algorithm cannot cause starvation?", "Round Robin")),
+]
+
+
+def merges(a, b):
+    candidate = bool(set(band_keys(minhash(a['question']))) & set(band_keys(minhash(b['question']))))
+    score = similarity(a['question'], b['question'])
+    return candidate and score >= SIMILARITY_THRESHOLD and same_answer(a, b), score
+
+
+def main():
+    failures = 0
+    for expected, pairs in ((True, DUPLICATES), (False, DISTINCT)):
+        for a, b in pairs:
+            merged, score = merges(a, b)
+            ok = merged == expected
+            failures += not ok
+            print(f"{'ok  ' if ok else 'FAIL'} {score:.2f} {'merge' if merged else 'keep '}  "
+                  f"{a['question']!r} / {b['question']!r}")
+    if failures:
+        sys.exit(f"{failures} pair(s) failed")
+
+
+if __name__ == "__main__":
+    main()
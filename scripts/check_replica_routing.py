@@ -0,0 +1,98 @@
+"""
+Checks read-replica routing (db_routing.py) locally with two SQLite files.
+
+The "replica" is a separate database that never receives writes, standing
+in for a lagging replica. The user's display name differs between the two
+files, so the rendered leaderboard shows which database a read went to.
+Run from the repo root:
+
+    python scripts/check_replica_routing.py
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+workdir = tempfile.mkdtemp(prefix="replica-check-")
+PRIMARY_PATH = os.path.join(workdir, "primary.db")
+REPLICA_PATH = os.path.join(workdir, "replica.db")
+
+# Config reads these at import time
+os.environ.setdefault('SECRET_KEY', 'replica-check')
+os.environ['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{PRIMARY_PATH}"
+os.environ['SQLALCHEMY_REPLICA_URI'] = f"sqlite:///{REPLICA_PATH}"
+os.environ['READ_YOUR_WRITES_SECONDS'] = '60'
+
+
+def seed(engine, display_name):
+    """Same user and one quiz result in a database, under a marker display name."""
+    from extensions import db
+    db.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(db.text(
+            "INSERT INTO user (id, email, display_name, password_hash) "
+            "VALUES (1, 'check@example.com', :name, 'x')"
+        ), {'name': display_name})
+        conn.execute(db.text(
+            "INSERT INTO quiz_result (subject, subject_id, level, score, total, timestamp, user_id) "
+            "VALUES ('Operating Systems', 'os', 'Beginner', 5, 10, CURRENT_TIMESTAMP, 1)"
+        ))
+
+
+def count_results(engine):
+    from extensions import db
+    with engine.connect() as conn:
+        return conn.execute(db.text("SELECT COUNT(*) FROM quiz_result")).scalar()
+
+
+def main():
+    from app import create_app
+    from extensions import db
+
+    app = create_app()
+    with app.app_context():
+        primary, replica = db.engines[None], db.engines['replica']
+        seed(primary, "primary-user")
+        seed(replica, "replica-user")
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = '1'
+        sess['_fresh'] = True
+
+    # 1. A read-only view reads from the replica
+    html = client.get("/leaderboard").get_data(as_text=True)
+    assert "replica-user" in html and "primary-user" not in html, "leaderboard did not read the replica"
+    print("ok  GET /leaderboard reads the replica")
+
+    # 2. A write goes to the primary only
+    with client.session_transaction() as sess:
+        sess['current_quiz'] = [{
+            "id": 1, "question": "Which of these is a scheduling algorithm?",
+            "option_a": "Round Robin", "option_b": "Quicksort", "option_c": "Dijkstra", "option_d": "LRU",
+            "correct_answer_letter": "A"
+        }]
+        sess['quiz_subject'] = "Operating Systems"
+        sess['quiz_subject_id'] = "os"
+        sess['quiz_level'] = "Beginner"
+    response = client.post("/submit_test", data={"q_1": "A"})
+    assert response.status_code == 302 and "/result/" in response.headers['Location'], response.data
+    assert (count_results(primary), count_results(replica)) == (2, 1), "submit_test did not write to the primary only"
+    print("ok  POST /submit_test writes to the primary only")
+
+    # 3. Within READ_YOUR_WRITES_SECONDS of the write, reads stay on the primary
+    html = client.get("/leaderboard").get_data(as_text=True)
+    assert "primary-user" in html and "replica-user" not in html, "read after write went to the replica"
+    print("ok  GET /leaderboard after submit_test reads the primary")
+
+    # 4. Once the window has passed, reads go back to the replica
+    with client.session_transaction() as sess:
+        sess['primary_reads_until'] = 0
+    html = client.get("/leaderboard").get_data(as_text=True)
+    assert "replica-user" in html, "reads did not return to the replica"
+    print("ok  GET /leaderboard reads the replica again after the window")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+import hashlib
+import json
+import random
+import re
+import zlib
+import numpy as np
+from extensions import db
+from models import Question, QuestionBand
+from services.item_analysis import question_hash, flagged_questions
+
+# --- MinHash / LSH parameters ---
+# 40 bands x 3 rows makes a pair at Jaccard 0.5 a candidate with ~99%
+# probability (0.4: ~93%). Candidates are then confirmed on the exact
+# Jaccard of their shingles, so MinHash noise can't decide a merge.
+NUM_BANDS = 40
+ROWS_PER_BAND = 3
+NUM_PERM = NUM_BANDS * ROWS_PER_BAND
+# Words plus word bigrams of the stemmed text. Rewordings of short questions
+# score around 0.5-0.6, so the threshold sits at 0.5;
+# questions that read alike but mean different things ("HTTP"/"HTTPS", an
+# added "NOT") are kept apart by the same_answer check instead.
+# Examples: scripts/check_dedup_pairs.py
+SHINGLE_SIZE = 2
+SIMILARITY_THRESHOLD = 0.5
+MAX_CANDIDATES = 50
+# Stored questions sampled from when topping up a quiz
+TOP_UP_POOL = 200
+OPTION_LETTERS = ['A', 'B', 'C', 'D']
+
+_PRIME = (1 << 31) - 1
+_rng = np.random.RandomState(20240607) # Fixed seed: signatures are persisted
+_PERM_A = _rng.randint(1, _PRIME, size=NUM_PERM).astype(np.uint64)
+_PERM_B = _rng.randint(0, _PRIME, size=NUM_PERM).astype(np.uint64)
+
+# Dropped before shingling; negations such as "not" are deliberately kept
+_FILLER_WORDS = {'a', 'an', 'the', 'is', 'are', 'of', 'which', 'following', 'what', 's',
+                 'does', 'do', 'for', 'to', 'in', 'by', 'one', 'these', 'this', 'that'}
+
+
+def _stem(word):
+    # Naive singularization, as in normalize_subject: "systems" -> "system"
+    if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+        return word[:-1]
+    return word
+
+
+def shingles(text):
+    """Words and word bigrams of the normalized question text."""
+    words = [_stem(w) for w in re.findall(r'\w+', (text or "").lower()) if w not in _FILLER_WORDS]
+    if len(words) <= 1:
+        return {" ".join(words)}
+    bigrams = {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+    return bigrams | set(words)
+
+
+def minhash(text):
+    """MinHash signature (uint64 array of length NUM_PERM) of a question text."""
+    hashes = np.fromiter(
+        (zlib.crc32(s.encode('utf-8')) for s in shingles(text)), dtype=np.uint64
+    )
+    # (a * x + b) mod p for every permutation/shingle pair, min over shingles
+    return ((_PERM_A[:, None] * hashes[None, :] + _PERM_B[:, None]) % _PRIME).min(axis=1)
+
+
+def band_keys(signature):
+    """LSH bucket keys, one per band of the signature."""
+    keys = []
+    for band in range(NUM_BANDS):
+        rows = signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        digest = hashlib.blake2b(rows.tobytes(), digest_size=8).hexdigest()
+        keys.append(f"{band:02d}{digest}")
+    return keys
+
+
+def similarity(text_a, text_b):
+    """Exact Jaccard similarity of two question texts' shingle sets."""
+    a, b = shingles(text_a), shingles(text_b)
+    return len(a & b) / len(a | b) if a or b else 0.0
+
+
+def _field(q, name):
+    """Reads a field from a quiz dict or a Question row."""
+    return q.get(name) if isinstance(q, dict) else getattr(q, name)
+
+
+def _normalize_option(text):
+    return " ".join(re.findall(r'\w+', str(text or "").lower()))
+
+
+def _correct_option(q):
+    letter = (_field(q, 'correct_answer_letter') or "").strip().upper()
+    if letter not in OPTION_LETTERS:
+        return None
+    return _normalize_option(_field(q, f"option_{letter.lower()}"))
+
+
+def same_answer(a, b):
+    """True if two questions have the same correct option text."""
+    answer = _correct_option(a)
+    return answer is not None and answer == _correct_option(b)
+
+
+def same_options(a, b):
+    """True if two questions have the same set of options and the same correct option."""
+    options_a = sorted(_normalize_option(_field(a, f"option_{l.lower()}")) for l in OPTION_LETTERS)
+    options_b = sorted(_normalize_option(_field(b, f"option_{l.lower()}")) for l in OPTION_LETTERS)
+    return options_a == options_b and same_answer(a, b)
+
+
+class LSHIndex:
+    """In-memory LSH index, used to dedupe a batch of questions against itself."""
+
+    def __init__(self):
+        self.buckets = {}
+        self.texts = []
+
+    def query(self, signature, text, accept=None):
+        """
+        Returns the index of a near-duplicate already in the index, or None.
+        If given, accept(idx) must also return True for the match to count.
+        """
+        seen = set()
+        for key in band_keys(signature):
+            for idx in self.buckets.get(key, ()):
+                if idx in seen:
+                    continue
+                seen.add(idx)
+                if similarity(text, self.texts[idx]) < SIMILARITY_THRESHOLD:
+                    continue
+                if accept is None or accept(idx):
+                    return idx
+        return None
+
+    def add(self, signature, text):
+        idx = len(self.texts)
+        self.texts.append(text)
+        for key in band_keys(signature):
+            self.buckets.setdefault(key, []).append(idx)
+        return idx
+
+
+def find_near_duplicate(signature, text, subject_id=None, accept=None, exclude_ids=()):
+    """
+    Looks up a stored near-duplicate via the QuestionBand index.
+    Only questions sharing at least one LSH band are compared, so the
+    cost depends on the number of candidates, not on the pool size.
+    Candidates in exclude_ids, or rejected by accept(question), are skipped.
+    """
+    query = db.session.query(Question).join(
+        QuestionBand, QuestionBand.question_id == Question.id
+    ).filter(QuestionBand.band_key.in_(band_keys(signature)))
+    if subject_id:
+        query = query.filter(Question.subject_id == subject_id)
+    if exclude_ids:
+        query = query.filter(Question.id.notin_(list(exclude_ids)))
+
+    best, best_score = None, SIMILARITY_THRESHOLD
+    for candidate in query.distinct().limit(MAX_CANDIDATES).all():
+        score = similarity(text, candidate.question)
+        if score >= best_score and (accept is None or accept(candidate)):
+            best, best_score = candidate, score
+    return best
+
+
+def store_question(q, subject_id, level, source, signature):
+    """Adds a new question and its LSH bands to the session (no commit)."""
+    stored = Question(
+        question_hash=question_hash(q['question']),
+        subject_id=subject_id,
+        level=level,
+        question=q['question'],
+        option_a=q['option_a'],
+        option_b=q['option_b'],
+        option_c=q['option_c'],
+        option_d=q['option_d'],
+        correct_answer_letter=q['correct_answer_letter'].strip().upper(),
+        source=source,
+        signature_json=json.dumps([int(v) for v in signature]),
+        bands=[QuestionBand(band_key=key) for key in band_keys(signature)]
+    )
+    db.session.add(stored)
+    return stored
+
+
+def register_questions(questions, subject_id, level, num_questions=None, source='generated'):
+    """
+    Dedupes a list of quiz questions and records them in the question store.
+    - Repeats and near-duplicates within the list are dropped.
+    - A near-duplicate of a stored question with the same correct answer is
+      merged: the stored wording is reused (so item statistics accumulate on
+      one question) and times_seen is incremented. Each stored question is
+      used at most once per quiz.
+    - New questions are inserted with their LSH bands.
+    - If questions were dropped, the quiz is topped up to num_questions with
+      stored questions of the same subject and level.
+    Returns the deduplicated list, renumbered from 1.
+    """
+    batch_index = LSHIndex()
+    batch = [] # questions added to batch_index, by index
+    kept = []
+    kept_hashes = set()
+    used_ids = set()
+
+    for q in questions:
+        qhash = question_hash(q['question'])
+        signature = minhash(q['question'])
+        twin = batch_index.query(signature, q['question'], lambda idx: same_answer(q, batch[idx]))
+        if qhash in kept_hashes or twin is not None:
+            continue
+        batch_index.add(signature, q['question'])
+        batch.append(q)
+
+        existing = Question.query.filter_by(question_hash=qhash).first()
+        if existing is not None and not same_answer(q, existing):
+            # Same text as a stored question but a different answer: the text can't
+            # be stored twice, so the generated version is used without storing it
+            kept_hashes.add(qhash)
+            kept.append(dict(q, id=len(kept) + 1))
+            continue
+        if existing is None:
+            existing = find_near_duplicate(signature, q['question'], subject_id,
+                                           accept=lambda candidate: same_answer(q, candidate),
+                                           exclude_ids=used_ids)
+
+        if existing is not None:
+            existing.times_seen = (existing.times_seen or 0) + 1
+            used_ids.add(existing.id)
+            kept_hashes.add(existing.question_hash)
+            kept.append(existing.to_quiz_dict(len(kept) + 1))
+        else:
+            store_question(q, subject_id, level, source, signature)
+            kept_hashes.add(qhash)
+            kept.append(dict(q, id=len(kept) + 1))
+
+    if num_questions and len(kept) < num_questions:
+        for extra in _top_up_questions(subject_id, level, num_questions - len(kept), used_ids, kept_hashes):
+            extra.times_seen = (extra.times_seen or 0) + 1
+            kept.append(extra.to_quiz_dict(len(kept) + 1))
+
+    try:
+        db.session.commit()
+    except Exception as e:
+        # A concurrent request may have inserted the same question; the quiz itself is still usable
+        db.session.rollback()
+        print(f"Error storing generated questions: {e}")
+
+    return kept
+
+
+def _top_up_questions(subject_id, level, count, used_ids, used_hashes):
+    """Random stored questions for a subject and level, excluding used and flagged ones."""
+    flagged = {stat.question_hash for stat in flagged_questions(subject_id)}
+    pool = Question.query.filter_by(subject_id=subject_id, level=level).order_by(
+        Question.times_seen.desc()
+    ).limit(TOP_UP_POOL).all()
+    pool = [q for q in pool
+            if q.id not in used_ids and q.question_hash not in used_hashes and q.question_hash not in flagged]
+    return random.sample(pool, min(count, len(pool)))
+
+
+def rebuild_signatures(batch_size=500, log=print):
+    """
+    Recomputes signature_json and the LSH bands of every stored question.
+    Needed after a change to the shingling or MinHash parameters.
+    """
+    db.session.query(QuestionBand).delete()
+    db.session.commit()
+
+    done = 0
+    last_id = 0
+    while True:
+        rows = Question.query.filter(Question.id > last_id).order_by(Question.id).limit(batch_size).all()
+        if not rows:
+            break
+        for question in rows:
+            signature = minhash(question.question)
+            question.signature_json = json.dumps([int(v) for v in signature])
+            question.bands = [QuestionBand(band_key=key) for key in band_keys(signature)]
+        db.session.commit()
+        done += len(rows)
+        last_id = rows[-1].id
+        log(f"Rebuilt signatures for {done} questions.")
+    return done
@@ -0,0 +1,130 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+from sqlalchemy import select
+from extensions import db
+from models import User, QuizResult, InterviewResult
+from services.subject_service import canonicalize_subject
+
+EXPORT_BATCH_SIZE = 1000
+FORMATS = ('csv', 'jsonl')
+
+QUIZ_COLUMNS = ['id', 'user_id', 'email', 'display_name', 'subject', 'subject_id', 'level',
+                'score', 'total', 'timestamp']
+QUIZ_DETAIL_COLUMNS = ['quiz_data_json', 'user_answers_json']
+INTERVIEW_COLUMNS = ['id', 'user_id', 'email', 'display_name', 'subject', 'subject_id', 'level',
+                     'question_text', 'user_answer', 'ai_score', 'ai_feedback', 'timestamp']
+
+
+def parse_date(value):
+    """Parses a YYYY-MM-DD date filter; returns None for empty values."""
+    if not value:
+        return None
+    return datetime.strptime(value, '%Y-%m-%d')
+
+
+def build_export_query(kind, start=None, end=None, subject=None, users=None, include_answers=False):
+    """
+    Builds a Core SELECT for quiz or interview results.
+    start/end are inclusive dates, users is a list of user IDs and/or emails.
+    Returns (statement, column names).
+    """
+    if kind == 'quiz':
+        model, columns = QuizResult, list(QUIZ_COLUMNS)
+        if include_answers:
+            columns += QUIZ_DETAIL_COLUMNS
+    elif kind == 'interview':
+        model, columns = InterviewResult, list(INTERVIEW_COLUMNS)
+    else:
+        raise ValueError(f"Unknown export kind: {kind}")
+
+    selected = []
+    for name in columns:
+        if name in ('email', 'display_name'):
+            selected.append(getattr(User, name).label(name))
+        else:
+            selected.append(getattr(model, name))
+
+    stmt = select(*selected).join(User, User.id == model.user_id)
+
+    if start:
+        stmt = stmt.where(model.timestamp >= start)
+    if end:
+        stmt = stmt.where(model.timestamp < end + timedelta(days=1))
+    if subject:
+        subject_id, _ = canonicalize_subject(subject)
+        stmt = stmt.where(model.subject_id == subject_id)
+    if users:
+        ids = [int(u) for u in users if str(u).isdigit()]
+        emails = [u for u in users if not str(u).isdigit()]
+        stmt = stmt.where(db.or_(User.id.in_(ids), User.email.in_(emails)))
+
+    # Ordered by primary key so the scan follows the clustered index
+    return stmt.order_by(model.id), columns
+
+
+def iter_rows(stmt):
+    """
+    Yields result rows through a server-side cursor, EXPORT_BATCH_SIZE at a time,
+    so memory use does not grow with the size of the export.
+    """
+    result = db.session.execute(
+        stmt.execution_options(stream_results=True, yield_per=EXPORT_BATCH_SIZE)
+    )
+    try:
+        for partition in result.partitions():
+            yield from partition
+    finally:
+        result.close()
+
+
+def _serialize(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def iter_csv(rows, columns):
+    """Encodes rows as CSV text chunks (one chunk per batch)."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    count = 0
+    for row in rows:
+        writer.writerow([_serialize(v) for v in row])
+        count += 1
+        if count % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_jsonl(rows, columns):
+    """Encodes rows as JSON Lines chunks; the stored JSON blobs are embedded as objects."""
+    lines = []
+    for row in rows:
+        record = {}
+        for name, value in zip(columns, row):
+            if name in QUIZ_DETAIL_COLUMNS:
+                record[name[:-len('_json')]] = json.loads(value) if value else None
+            else:
+                record[name] = _serialize(value)
+        lines.append(json.dumps(record))
+        if len(lines) >= EXPORT_BATCH_SIZE:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+def stream_export(kind, fmt, **filters):
+    """Returns a generator of text chunks for the requested export."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    stmt, columns = build_export_query(kind, **filters)
+    rows = iter_rows(stmt)
+    if fmt == 'csv':
+        return iter_csv(rows, columns)
+    return iter_jsonl(rows, columns)
@@ -3,6 +3,7 @@ from google.generativeai.types import GenerationConfig
 from google.generativeai.protos import Schema, Type
 import json
 import os
+from services.usage_service import metered
 
 MODEL_NAME = "gemini-2.5-flash-lite" 
 api_key = os.getenv("GOOGLE_API_KEY")
@@ -77,16 +78,52 @@ interview_grade_schema = Schema(
 )
 
 
-def generate_quiz_from_gemini(subject, level, num_questions=10):
+# --- Define batched Interview Grade JSON structure (one entry per answer) ---
+interview_batch_grade_schema = Schema(
+    type=Type.OBJECT,
+    properties={
+        'grades': Schema(
+            type=Type.ARRAY,
+            items=Schema(
+                type=Type.OBJECT,
+                properties={
+                    'index': Schema(
+                        type=Type.INTEGER,
+                        description="The number of the answer being graded, as given in the prompt."
+                    ),
+                    'score': Schema(
+                        type=Type.INTEGER,
+                        description="A score from 1 (poor) to 5 (excellent)."
+                    ),
+                    'feedback': Schema(
+                        type=Type.STRING,
+                        description="Concise, constructive feedback on the user's answer, explaining what was right and wrong."
+                    )
+                },
+                required=['index', 'score', 'feedback']
+            )
+        )
+    },
+    required=['grades']
+)
+
+
+def build_quiz_prompt(subject, level, num_questions=10, avoid_questions=None):
     """
-    Calls the Gemini API to generate quiz questions and returns them
-    as a Python dictionary (parsed from the JSON response).
+    Builds the quiz generation prompt.
+    avoid_questions lists question texts that item analysis flagged as
+    too easy, too hard or ambiguous; the model is asked not to reuse them.
     """
-    if not model:
-        raise Exception("Gemini model is not initialized.")
-        
-    try:
-        prompt = f"""
+    avoid_block = ""
+    if avoid_questions:
+        avoid_list = "\n".join(f"- {q}" for q in avoid_questions)
+        avoid_block = f"""
+        Do NOT ask these questions or close paraphrases of them
+        (students found them too easy, too hard or ambiguous):
+{avoid_list}
+        """
+
+    return f"""
         You are an expert quiz creator.
         Generate a {num_questions}-question multiple-choice quiz on the topic of "{subject}"
         at a "{level}" difficulty level.
@@ -101,37 +138,128 @@ def generate_quiz_from_gemini(subject, level, num_questions=10):
         7. "correct_answer_letter": The *letter* of the correct answer (e.g., 'A', 'B', 'C', or 'D').
 
         Do NOT include 'A)', 'B)', etc. prefixes in the option_a, option_b... strings.
+        {avoid_block}
         Adhere *strictly* to the JSON schema provided.
         """
 
+
+def parse_quiz_response(text):
+    """Parses the model's JSON quiz response into a list of questions."""
+    quiz_data = json.loads(text)
+
+    if 'questions' not in quiz_data or not quiz_data['questions']:
+        raise Exception("AI returned empty or invalid quiz data.")
+
+    return quiz_data["questions"] # Return just the list of questions
+
+
+def quiz_error_fallback(e):
+    """Single placeholder question shown when quiz generation fails."""
+    print(f"Error generating quiz from Gemini: {e}")
+    return [
+        {
+            "id": 1,
+            "question": f"Error: Could not generate quiz. The AI model may be temporarily unavailable or rate limits exceeded. Please try again later. (Error: {str(e)})",
+            "option_a": "Sorry, please try again.", "option_b": "Option B",
+            "option_c": "Option C", "option_d": "Option D",
+            "correct_answer_letter": "A",
+            "error": True
+        }
+    ]
+
+
+def generate_quiz_from_gemini(subject, level, num_questions=10, avoid_questions=None):
+    """
+    Calls the Gemini API to generate quiz questions and returns them
+    as a Python dictionary (parsed from the JSON response).
+    """
+    if not model:
+        raise Exception("Gemini model is not initialized.")
+        
+    try:
         generation_config = GenerationConfig(
             response_mime_type="application/json",
             response_schema=quiz_schema
         )
 
-        response = model.generate_content(
-            prompt,
+        response = metered(
+            'quiz', model.generate_content,
+            build_quiz_prompt(subject, level, num_questions, avoid_questions),
             generation_config=generation_config
         )
 
-        quiz_data = json.loads(response.text)
-        
-        if 'questions' not in quiz_data or not quiz_data['questions']:
-            raise Exception("AI returned empty or invalid quiz data.")
-            
-        return quiz_data["questions"] # Return just the list of questions
+        return parse_quiz_response(response.text)
 
     except Exception as e:
-        print(f"Error generating quiz from Gemini: {e}")
-        return [
-            {
-                "id": 1,
-                "question": f"Error: Could not generate quiz. The AI model may be temporarily unavailable or rate limits exceeded. Please try again later. (Error: {str(e)})",
-                "option_a": "Sorry, please try again.", "option_b": "Option B",
-                "option_c": "Option C", "option_d": "Option D",
-                "correct_answer_letter": "A"
-            }
-        ]
+        return quiz_error_fallback(e)
+
+
+# --- Prompts shared by the API views and services ---
+
+def build_explain_prompt(question, user_answer, correct_answer):
+    return f"""
+        You are a helpful tutor. My student was answering a quiz question.
+        The question was: "{question}"
+        They answered: "{user_answer}"
+        The correct answer is: "{correct_answer}"
+
+        Please provide a concise, friendly explanation (2-3 sentences)
+        about why their answer was incorrect and why the correct answer is correct.
+        """
+
+
+def build_study_guide_prompt(subject, level):
+    return f"""
+        You are an expert tutor. Generate a concise study guide
+        for the topic "{subject}" at a "{level}" level.
+        The guide should be able to help a student who has never taken this course and be able to study for this subject with the hlp of study guide provided by you.
+        Suggest key topics and subtopics to cover in the study guide. Also, Suggest youtube videos and website links to cover in the study guide.
+        """
+
+
+def build_interview_question_prompt(subject, level):
+    return f"""
+        You are an expert interviewer. 
+        Generate one concise, open-ended interview question for a candidate 
+        at a "{level}" level on the topic of "{subject}".
+        Do not add any preamble, just return the question text.
+        """
+
+
+def build_grade_prompt(subject, level, question, user_answer):
+    return f"""
+        You are an expert tech interviewer. A candidate was asked the following question
+        on the topic of "{subject}" at a "{level}" level:
+        "{question}"
+
+        The candidate provided this answer:
+        "{user_answer}"
+
+        Please grade their answer. Provide a score from 1 (poor) to 5 (excellent)
+        and concise, constructive feedback on their answer's accuracy and completeness.
+        Adhere *strictly* to the JSON schema.
+        """
+
+
+def build_batch_grade_prompt(subject, level, items):
+    """items is a list of (question, user_answer) pairs, numbered from 1 in the prompt."""
+    answers = "\n".join(
+        f"""
+        Answer {i}:
+        Question: "{question}"
+        Candidate's answer: "{user_answer}"
+        """
+        for i, (question, user_answer) in enumerate(items, start=1)
+    )
+    return f"""
+        You are an expert tech interviewer. A candidate answered the following
+        {len(items)} questions on the topic of "{subject}" at a "{level}" level.
+        {answers}
+        Grade each answer independently. For each one, return its number as "index",
+        a score from 1 (poor) to 5 (excellent) and concise, constructive feedback
+        on the answer's accuracy and completeness.
+        Adhere *strictly* to the JSON schema.
+        """
 
 # --- Define Video Interview Grade JSON structure ---
 video_interview_grade_schema = Schema(
@@ -198,7 +326,8 @@ def analyze_video_interview(video_path, question_text, subject, level):
             response_schema=video_interview_grade_schema
         )
 
-        response = model.generate_content(
+        response = metered(
+            'grade_video', model.generate_content,
             [video_file, prompt],
             generation_config=generation_config
         )
@@ -0,0 +1,233 @@
+import json
+import time
+from datetime import datetime
+from sqlalchemy import insert
+from extensions import db
+from models import Question, QuestionBand
+from services.item_analysis import question_hash
+from services.dedup_service import LSHIndex, minhash, band_keys, find_near_duplicate, same_options
+from services.subject_service import canonicalize_subject
+
+READ_CHUNK_SIZE = 64 * 1024
+OPTION_LETTERS = ['A', 'B', 'C', 'D']
+# Same fields quiz_schema requires (ids are assigned when a quiz is built)
+REQUIRED_FIELDS = ['question', 'option_a', 'option_b', 'option_c', 'option_d', 'correct_answer_letter']
+
+
+class ImportStats:
+    """Counters reported while an import runs."""
+
+    def __init__(self):
+        self.started = time.time()
+        self.read = 0
+        self.inserted = 0
+        self.updated = 0
+        self.merged = 0
+        self.invalid = 0
+
+    def summary(self):
+        elapsed = max(time.time() - self.started, 1e-6)
+        return (f"{self.read} read, {self.inserted} inserted, {self.updated} updated, "
+                f"{self.merged} merged as near-duplicates, {self.invalid} invalid "
+                f"({self.read / elapsed:.0f} records/s)")
+
+
+def iter_json_records(fileobj):
+    """
+    Incrementally yields records from a JSON array or a JSON Lines file,
+    reading READ_CHUNK_SIZE characters at a time instead of loading the whole file.
+    """
+    decoder = json.JSONDecoder()
+    buffer = fileobj.read(READ_CHUNK_SIZE)
+    stripped = buffer.lstrip()
+
+    # JSON Lines: one record per line
+    if not stripped.startswith('['):
+        pending = ""
+        while buffer:
+            pending += buffer
+            lines = pending.split('\n')
+            pending = lines.pop()
+            for line in lines:
+                if line.strip():
+                    yield json.loads(line)
+            buffer = fileobj.read(READ_CHUNK_SIZE)
+        if pending.strip():
+            yield json.loads(pending)
+        return
+
+    # JSON array: decode one element at a time with raw_decode
+    pos = len(buffer) - len(stripped) + 1
+    eof = False
+    while True:
+        # Skip whitespace and separators between elements
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos < len(buffer) or eof:
+                break
+            buffer, pos = fileobj.read(READ_CHUNK_SIZE), 0
+            eof = not buffer
+
+        if pos >= len(buffer):
+            raise ValueError("Unterminated JSON array")
+        if buffer[pos] == ']':
+            return
+
+        try:
+            record, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            # Element spans the chunk boundary, read more
+            chunk = fileobj.read(READ_CHUNK_SIZE)
+            eof = not chunk
+            buffer, pos = buffer[pos:] + chunk, 0
+            continue
+
+        yield record
+        pos = end
+
+
+def normalize_record(record, default_subject=None, default_level=None):
+    """
+    Converts a bank record into the quiz question format. Accepts the
+    questions.json style (option_a..option_d + correct_answer), the
+    osquestions.json style (options list + answer) and generated quizzes
+    (correct_answer_letter). Returns None if the record is invalid.
+    """
+    if not isinstance(record, dict):
+        return None
+
+    q = {'question': record.get('question')}
+    options = record.get('options')
+    if isinstance(options, list):
+        if len(options) != 4:
+            return None
+        for letter, text in zip(OPTION_LETTERS, options):
+            q[f"option_{letter.lower()}"] = text
+    else:
+        for letter in OPTION_LETTERS:
+            q[f"option_{letter.lower()}"] = record.get(f"option_{letter.lower()}")
+
+    answer = record.get('correct_answer_letter') or record.get('correct_answer') or record.get('answer')
+    q['correct_answer_letter'] = str(answer).strip().upper() if answer is not None else None
+
+    for field in REQUIRED_FIELDS:
+        value = q.get(field)
+        if not isinstance(value, (str, int, float)) or not str(value).strip():
+            return None
+        q[field] = str(value).strip()
+    if q['correct_answer_letter'] not in OPTION_LETTERS:
+        return None
+
+    subject_id, _ = canonicalize_subject(record.get('subject') or default_subject)
+    return {
+        'question': q,
+        'subject_id': subject_id,
+        'level': record.get('level') or default_level
+    }
+
+
+def _import_batch(batch, stats, log=print):
+    """
+    Upserts a batch of normalized records in one transaction. Existing
+    questions are updated through the ORM; new ones go in as two
+    executemany INSERTs (questions, then their LSH bands).
+    A near-duplicate is only merged when its options and answer match too;
+    every merge is logged so it can be checked after the import.
+    """
+    hashes = [question_hash(item['question']['question']) for item in batch]
+    existing = {
+        row.question_hash: row
+        for row in Question.query.filter(Question.question_hash.in_(set(hashes))).all()
+    }
+    batch_index = LSHIndex()
+    indexed = [] # questions added to batch_index, by index
+    new_rows = {} # question_hash -> column values
+    new_bands = {} # question_hash -> band keys
+
+    # No autoflush: in-batch duplicates are caught by batch_index, not the database
+    with db.session.no_autoflush:
+        for item, qhash in zip(batch, hashes):
+            q = item['question']
+            row = existing.get(qhash)
+            if row is not None:
+                # Exact match: refresh answer data from the bank
+                row.option_a, row.option_b = q['option_a'], q['option_b']
+                row.option_c, row.option_d = q['option_c'], q['option_d']
+                row.correct_answer_letter = q['correct_answer_letter']
+                row.level = item['level'] or row.level
+                stats.updated += 1
+                continue
+
+            signature = minhash(q['question'])
+            if qhash in new_rows:
+                stats.merged += 1
+                log(f"Merged repeated record: {q['question'][:80]!r}")
+                continue
+            twin = batch_index.query(signature, q['question'], lambda idx: same_options(q, indexed[idx]))
+            if twin is not None:
+                stats.merged += 1
+                log(f"Merged {q['question'][:80]!r} -> earlier record {indexed[twin]['question'][:80]!r}")
+                continue
+            batch_index.add(signature, q['question'])
+            indexed.append(q)
+
+            near = find_near_duplicate(signature, q['question'], item['subject_id'],
+                                       accept=lambda candidate: same_options(q, candidate))
+            if near is not None:
+                near.times_seen = (near.times_seen or 0) + 1
+                stats.merged += 1
+                log(f"Merged {q['question'][:80]!r} -> question {near.id}")
+                continue
+
+            new_rows[qhash] = dict(
+                q,
+                question_hash=qhash,
+                subject_id=item['subject_id'],
+                level=item['level'],
+                source='import',
+                times_seen=1,
+                signature_json=json.dumps([int(v) for v in signature]),
+                created_at=datetime.utcnow()
+            )
+            new_bands[qhash] = band_keys(signature)
+
+    if new_rows:
+        db.session.execute(insert(Question), list(new_rows.values()))
+        ids = db.session.query(Question.question_hash, Question.id).filter(
+            Question.question_hash.in_(list(new_rows.keys()))
+        ).all()
+        db.session.execute(insert(QuestionBand), [
+            {'question_id': question_id, 'band_key': key}
+            for qhash, question_id in ids
+            for key in new_bands[qhash]
+        ])
+        stats.inserted += len(new_rows)
+
+    db.session.commit()
+
+
+def import_questions(fileobj, default_subject=None, default_level=None, batch_size=1000, log=print):
+    """Streams a question bank into the Question table, batch_size records per transaction."""
+    stats = ImportStats()
+    batch = []
+
+    for record in iter_json_records(fileobj):
+        stats.read += 1
+        item = normalize_record(record, default_subject, default_level)
+        if item is None:
+            stats.invalid += 1
+            continue
+        batch.append(item)
+
+        if len(batch) >= batch_size:
+            _import_batch(batch, stats, log)
+            batch = []
+            log(stats.summary())
+
+    if batch:
+        _import_batch(batch, stats, log)
+    log(f"Import finished: {stats.summary()}")
+    return stats
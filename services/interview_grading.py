@@ -0,0 +1,185 @@
+import json
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from google.generativeai.types import GenerationConfig
+from extensions import db
+from models import PendingAnswer, InterviewResult
+from services.gemini_service import (model, interview_grade_schema, interview_batch_grade_schema,
+                                     build_grade_prompt, build_batch_grade_prompt)
+from services.page_cache import bump_version, user_key
+from services.usage_service import QuotaExceeded
+from services.llm_async import gather_metered
+
+# Answers graded per structured call; keeps responses well inside output limits
+MAX_BATCH_ITEMS = 10
+
+
+def _valid_grade(grade):
+    score = grade.get('score')
+    feedback = grade.get('feedback')
+    return isinstance(score, int) and 1 <= score <= 5 and isinstance(feedback, str) and feedback.strip()
+
+
+def _batch_request(subject, level, answers):
+    """(prompt, generation_config) grading several PendingAnswers in one structured call."""
+    prompt = build_batch_grade_prompt(subject, level, [(a.question_text, a.user_answer) for a in answers])
+    generation_config = GenerationConfig(
+        response_mime_type="application/json",
+        response_schema=interview_batch_grade_schema
+    )
+    return prompt, generation_config
+
+
+def _parse_batch(answers, response):
+    """Returns {pending_answer.id: {"score", "feedback"}} for the valid grades only."""
+    grades = {}
+    for grade in json.loads(response.text).get('grades', []):
+        index = grade.get('index')
+        if isinstance(index, int) and 1 <= index <= len(answers) and _valid_grade(grade):
+            grades[answers[index - 1].id] = {"score": grade['score'], "feedback": grade['feedback']}
+    return grades
+
+
+def _single_request(answer):
+    """(prompt, generation_config) grading one PendingAnswer with the per-answer schema."""
+    prompt = build_grade_prompt(answer.subject, answer.level, answer.question_text, answer.user_answer)
+    generation_config = GenerationConfig(
+        response_mime_type="application/json",
+        response_schema=interview_grade_schema
+    )
+    return prompt, generation_config
+
+
+def _parse_single(response):
+    grade = json.loads(response.text)
+    if not _valid_grade(grade):
+        raise ValueError("Model returned an invalid grade.")
+    return {"score": grade['score'], "feedback": grade['feedback']}
+
+
+def _gather(requests, user_id):
+    """Runs grading calls concurrently; a quota error becomes every call's result."""
+    try:
+        return gather_metered('grade_session', requests, user_id)
+    except QuotaExceeded as e:
+        return [e] * len(requests)
+
+
+def grade_session(user_id, session_token):
+    """
+    Grades every queued answer of an interview session.
+    1. Answers are graded in multi-item calls of up to MAX_BATCH_ITEMS,
+       all sent at once on the shared LLM loop (services/llm_async.py).
+    2. Answers missing or invalid in a batch response are retried one by
+       one, again all at once.
+    3. All grades are written to InterviewResult in a single transaction;
+       answers that still failed stay queued for the next attempt.
+    Returns (graded results, failed answers) as lists of dicts.
+    """
+    if not model:
+        raise Exception("Gemini model is not initialized.")
+
+    pending = PendingAnswer.query.filter_by(
+        user_id=user_id, session_token=session_token
+    ).order_by(PendingAnswer.id).all()
+
+    grades = {}
+    errors = {}
+
+    # 1. Batched calls, one group per subject/level
+    groups = {}
+    for answer in pending:
+        groups.setdefault((answer.subject, answer.level), []).append(answer)
+    batches = [
+        answers[i:i + MAX_BATCH_ITEMS]
+        for (subject, level), answers in groups.items()
+        for i in range(0, len(answers), MAX_BATCH_ITEMS)
+    ]
+    requests = [_batch_request(batch[0].subject, batch[0].level, batch) for batch in batches]
+    for batch, response in zip(batches, _gather(requests, user_id)):
+        try:
+            if isinstance(response, Exception):
+                raise response
+            grades.update(_parse_batch(batch, response))
+        except Exception as e:
+            print(f"Error in batched interview grading: {e}")
+
+    # 2. Per-item retry for whatever the batch did not grade
+    retry = [answer for answer in pending if answer.id not in grades]
+    for answer, response in zip(retry, _gather([_single_request(a) for a in retry], user_id)):
+        try:
+            if isinstance(response, Exception):
+                raise response
+            grades[answer.id] = _parse_single(response)
+        except Exception as e:
+            errors[answer.id] = str(e)
+
+    # 3. Single transaction for the whole session
+    results, failed = [], []
+    for answer in pending:
+        grade = grades.get(answer.id)
+        if grade is None:
+            answer.attempts = (answer.attempts or 0) + 1
+            answer.last_error = errors.get(answer.id)
+            failed.append({"question": answer.question_text, "error": answer.last_error})
+            continue
+
+        db.session.add(InterviewResult(
+            subject=answer.subject,
+            subject_id=answer.subject_id,
+            level=answer.level,
+            question_text=answer.question_text,
+            user_answer=answer.user_answer,
+            ai_feedback=grade['feedback'],
+            ai_score=grade['score'],
+            user_id=user_id
+        ))
+        db.session.delete(answer)
+        results.append({"question": answer.question_text, "score": grade['score'], "feedback": grade['feedback']})
+
+    db.session.commit()
+    if results:
+        bump_version(user_key(user_id))
+    return results, failed
+
+
+def stale_sessions(stale_minutes, user_id=None):
+    """
+    (user_id, session_token) pairs with queued answers and no new answer for
+    stale_minutes: the page was closed before "Finish & Grade Session".
+    """
+    cutoff = datetime.utcnow() - timedelta(minutes=stale_minutes)
+    query = db.session.query(PendingAnswer.user_id, PendingAnswer.session_token)
+    if user_id is not None:
+        query = query.filter(PendingAnswer.user_id == user_id)
+    return query.group_by(PendingAnswer.user_id, PendingAnswer.session_token).having(
+        func.max(PendingAnswer.timestamp) < cutoff
+    ).all()
+
+
+def adopt_stale_answers(user_id, session_token, stale_minutes):
+    """
+    Moves the user's answers from abandoned sessions into session_token, so
+    they are graded when that session finishes. Their timestamps are reset
+    so the new session does not itself count as stale. Returns the number moved.
+    """
+    tokens = [token for _, token in stale_sessions(stale_minutes, user_id=user_id)]
+    if not tokens:
+        return 0
+    moved = PendingAnswer.query.filter(
+        PendingAnswer.user_id == user_id, PendingAnswer.session_token.in_(tokens)
+    ).update(
+        {PendingAnswer.session_token: session_token, PendingAnswer.timestamp: datetime.utcnow()},
+        synchronize_session=False
+    )
+    db.session.commit()
+    return moved
+
+
+def expire_pending(max_attempts):
+    """Deletes queued answers that failed grading max_attempts times. Returns the number deleted."""
+    deleted = PendingAnswer.query.filter(
+        PendingAnswer.attempts >= max_attempts
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
@@ -0,0 +1,264 @@
+import hashlib
+import json
+import re
+import time
+from array import array
+import numpy as np
+from sqlalchemy import func
+from extensions import db
+from models import QuizResult, QuestionStat, ItemAnalysisRun
+
+OPTION_LETTERS = ['A', 'B', 'C', 'D']
+NO_ANSWER = 4 # Column index for skipped / invalid answers
+NUM_CHOICES = 5
+
+# Thresholds used to flag questions for question selection
+MIN_ATTEMPTS = 20
+TOO_EASY = 0.95
+TOO_HARD = 0.15
+MIN_DISCRIMINATION = 0.1
+
+# Text of quiz_error_fallback's placeholder; older results predate its "error" flag
+ERROR_QUESTION_PREFIX = "Error: Could not generate quiz."
+
+
+def question_hash(question_text):
+    """Stable identity for a question across attempts (case/whitespace-insensitive)."""
+    normalized = " ".join(re.findall(r'\w+', (question_text or "").lower()))
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+
+
+class _Responses:
+    """Columnar buffer of (attempt, question, option chosen, correct option) tuples."""
+
+    def __init__(self):
+        self.attempt_idx = array('i')
+        self.item_idx = array('i')
+        self.chosen = array('b')
+        self.key = array('b')
+        self.attempt_totals = array('i')
+        self.item_ids = {} # question_hash -> item index
+        self.items = [] # (question_hash, subject_id, question_text)
+
+    def _item(self, question, subject_id):
+        qhash = question_hash(question)
+        idx = self.item_ids.get(qhash)
+        if idx is None:
+            idx = len(self.items)
+            self.item_ids[qhash] = idx
+            self.items.append((qhash, subject_id, question))
+        return idx
+
+    def add_result(self, subject_id, quiz_data_json, user_answers_json):
+        """Parses one QuizResult's blobs into the buffer. Returns responses added."""
+        try:
+            questions = json.loads(quiz_data_json or "[]")
+            answers = json.loads(user_answers_json or "{}")
+        except ValueError:
+            return 0
+
+        attempt = len(self.attempt_totals)
+        added = 0
+        for q in questions:
+            # Placeholder shown when generation failed (quiz_error_fallback), not a real item
+            if q.get('error') or (q.get('question') or "").startswith(ERROR_QUESTION_PREFIX):
+                continue
+            correct_letter = (q.get('correct_answer_letter') or "").strip().upper()
+            if correct_letter not in OPTION_LETTERS or not q.get('question'):
+                continue
+
+            # user_answers_json stores the chosen option *text*, map it back to a letter
+            answer_text = answers.get(q['question'])
+            chosen = NO_ANSWER
+            for i, letter in enumerate(OPTION_LETTERS):
+                if answer_text is not None and q.get(f"option_{letter.lower()}") == answer_text:
+                    chosen = i
+                    break
+
+            self.attempt_idx.append(attempt)
+            self.item_idx.append(self._item(q['question'], subject_id))
+            self.chosen.append(chosen)
+            self.key.append(OPTION_LETTERS.index(correct_letter))
+            added += 1
+
+        if added:
+            self.attempt_totals.append(added)
+        return added
+
+    def __len__(self):
+        return len(self.item_idx)
+
+
+def _aggregate(responses):
+    """
+    Vectorized per-item sufficient statistics for a buffer of responses.
+    Returns a dict of NumPy arrays indexed by item.
+    """
+    n_items = len(responses.items)
+    attempt_idx = np.frombuffer(responses.attempt_idx, dtype=np.int32)
+    item_idx = np.frombuffer(responses.item_idx, dtype=np.int32)
+    chosen = np.frombuffer(responses.chosen, dtype=np.int8).astype(np.int64)
+    key = np.frombuffer(responses.key, dtype=np.int8)
+    totals = np.frombuffer(responses.attempt_totals, dtype=np.int32).astype(np.float64)
+
+    x = (chosen == key).astype(np.float64)
+
+    # Rest score: the attempt's score fraction excluding this item
+    attempt_scores = np.bincount(attempt_idx, weights=x, minlength=len(totals))
+    rest_total = totals[attempt_idx] - 1
+    y = np.divide(attempt_scores[attempt_idx] - x, rest_total,
+                  out=np.zeros_like(x), where=rest_total > 0)
+
+    option_cells = item_idx.astype(np.int64) * NUM_CHOICES + chosen
+    return {
+        'attempts': np.bincount(item_idx, minlength=n_items),
+        'sum_x': np.bincount(item_idx, weights=x, minlength=n_items),
+        'sum_y': np.bincount(item_idx, weights=y, minlength=n_items),
+        'sum_yy': np.bincount(item_idx, weights=y * y, minlength=n_items),
+        'sum_xy': np.bincount(item_idx, weights=x * y, minlength=n_items),
+        'option_counts': np.bincount(option_cells, minlength=n_items * NUM_CHOICES).reshape(n_items, NUM_CHOICES),
+        'option_score_sums': np.bincount(option_cells, weights=y, minlength=n_items * NUM_CHOICES).reshape(n_items, NUM_CHOICES),
+    }
+
+
+def _derive(n, sum_x, sum_y, sum_yy, sum_xy):
+    """Difficulty (p-value) and point-biserial discrimination from sufficient statistics."""
+    difficulty = np.divide(sum_x, n, out=np.zeros_like(sum_x), where=n > 0)
+    # x is 0/1, so sum(x^2) == sum(x)
+    cov = n * sum_xy - sum_x * sum_y
+    var = (n * sum_x - sum_x ** 2) * (n * sum_yy - sum_y ** 2)
+    discrimination = np.divide(cov, np.sqrt(np.clip(var, 0, None)),
+                               out=np.zeros_like(cov), where=var > 0)
+    return difficulty, discrimination
+
+
+def _persist(responses):
+    """Merges a buffer's statistics into QuestionStat rows."""
+    if not len(responses):
+        return
+    stats = _aggregate(responses)
+
+    hashes = [item[0] for item in responses.items]
+    existing = {}
+    for i in range(0, len(hashes), 500):
+        chunk = hashes[i:i + 500]
+        for row in QuestionStat.query.filter(QuestionStat.question_hash.in_(chunk)).all():
+            existing[row.question_hash] = row
+
+    # Merge with previously stored sufficient statistics
+    n_items = len(hashes)
+    prev = np.zeros((n_items, 5))
+    prev_counts = np.zeros((n_items, NUM_CHOICES))
+    prev_sums = np.zeros((n_items, NUM_CHOICES))
+    for i, qhash in enumerate(hashes):
+        row = existing.get(qhash)
+        if row is not None:
+            prev[i] = (row.attempts, row.sum_x, row.sum_y, row.sum_yy, row.sum_xy)
+            prev_counts[i] = json.loads(row.option_counts_json or "[0, 0, 0, 0, 0]")
+            prev_sums[i] = json.loads(row.option_score_sums_json or "[0, 0, 0, 0, 0]")
+
+    n = prev[:, 0] + stats['attempts']
+    sum_x = prev[:, 1] + stats['sum_x']
+    sum_y = prev[:, 2] + stats['sum_y']
+    sum_yy = prev[:, 3] + stats['sum_yy']
+    sum_xy = prev[:, 4] + stats['sum_xy']
+    option_counts = prev_counts + stats['option_counts']
+    option_sums = prev_sums + stats['option_score_sums']
+    difficulty, discrimination = _derive(n, sum_x, sum_y, sum_yy, sum_xy)
+
+    for i, (qhash, subject_id, question) in enumerate(responses.items):
+        row = existing.get(qhash)
+        if row is None:
+            row = QuestionStat(question_hash=qhash, subject_id=subject_id, question_text=question)
+            db.session.add(row)
+        row.attempts = int(n[i])
+        row.sum_x = float(sum_x[i])
+        row.sum_y = float(sum_y[i])
+        row.sum_yy = float(sum_yy[i])
+        row.sum_xy = float(sum_xy[i])
+        row.option_counts_json = json.dumps([int(c) for c in option_counts[i]])
+        row.option_score_sums_json = json.dumps([round(float(s), 6) for s in option_sums[i]])
+        row.difficulty = float(difficulty[i])
+        row.discrimination = float(discrimination[i])
+
+
+def run_item_analysis(batch_size=5000, full=False, log=print):
+    """
+    Streams QuizResult rows after the last run's watermark in batches,
+    and merges their item statistics into QuestionStat.
+    With full=True, all statistics are rebuilt from scratch.
+    """
+    if full:
+        QuestionStat.query.delete()
+        ItemAnalysisRun.query.delete()
+        db.session.commit()
+
+    watermark = db.session.query(func.max(ItemAnalysisRun.last_result_id)).scalar() or 0
+    started = time.time()
+    results_processed = 0
+    responses_processed = 0
+    last_id = watermark
+
+    while True:
+        rows = db.session.query(
+            QuizResult.id, QuizResult.subject_id, QuizResult.quiz_data_json, QuizResult.user_answers_json
+        ).filter(QuizResult.id > last_id).order_by(QuizResult.id).limit(batch_size).all()
+        if not rows:
+            break
+
+        responses = _Responses()
+        for _, subject_id, quiz_data_json, user_answers_json in rows:
+            responses.add_result(subject_id, quiz_data_json, user_answers_json)
+
+        _persist(responses)
+        last_id = rows[-1][0]
+        results_processed += len(rows)
+        responses_processed += len(responses)
+
+        # Commit stats and watermark together so a crash never double-counts a batch
+        db.session.add(ItemAnalysisRun(
+            last_result_id=last_id,
+            results_processed=len(rows),
+            responses_processed=len(responses)
+        ))
+        db.session.commit()
+        log(f"Processed {results_processed} results ({responses_processed} responses) up to id {last_id}")
+
+    elapsed = time.time() - started
+    log(f"Item analysis finished in {elapsed:.1f}s: {results_processed} results, {responses_processed} responses.")
+    return results_processed, responses_processed
+
+
+def distractor_stats(stat):
+    """Per-option choice share and mean rest score for a QuestionStat row."""
+    counts = json.loads(stat.option_counts_json or "[0, 0, 0, 0, 0]")
+    sums = json.loads(stat.option_score_sums_json or "[0, 0, 0, 0, 0]")
+    labels = OPTION_LETTERS + ['No Answer']
+    return [
+        {
+            "option": labels[i],
+            "share": (counts[i] / stat.attempts) if stat.attempts else 0,
+            "mean_rest_score": (sums[i] / counts[i]) if counts[i] else None
+        }
+        for i in range(NUM_CHOICES)
+    ]
+
+
+def flagged_questions(subject_id, limit=20):
+    """
+    Questions with enough attempts that are too easy, too hard or
+    non-discriminating (likely broken or ambiguous).
+    """
+    if not subject_id:
+        return []
+    rows = QuestionStat.query.filter(
+        QuestionStat.subject_id == subject_id,
+        QuestionStat.attempts >= MIN_ATTEMPTS,
+        db.or_(
+            QuestionStat.difficulty >= TOO_EASY,
+            QuestionStat.difficulty <= TOO_HARD,
+            QuestionStat.discrimination < MIN_DISCRIMINATION
+        )
+    ).order_by(QuestionStat.attempts.desc()).limit(limit).all()
+    return rows
+
@@ -0,0 +1,78 @@
+import asyncio
+import os
+import threading
+from services.gemini_service import model
+from services.usage_service import check_quota, record_usage
+
+# Concurrent Gemini calls from synchronous code. Views run on WSGI threads,
+# so instead of async views, a request that needs several independent model
+# calls (e.g. grade_session) hands them to one process-wide event loop and
+# waits for all of them; see benchmarks/bench_llm_fanout.py.
+
+# Upper bound on model calls in flight at once from this process
+MAX_IN_FLIGHT = int(os.getenv('LLM_MAX_IN_FLIGHT', 256))
+
+_loop = None
+_semaphore = None
+_loop_lock = threading.Lock()
+
+
+def get_llm_loop():
+    """
+    Returns the process-wide event loop that owns the async Gemini client.
+    The SDK's async client binds its connection to the loop it was first
+    used on, so every async call is run here; the connection is then
+    reused across requests.
+    """
+    global _loop, _semaphore
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="llm-loop", daemon=True).start()
+                _semaphore = asyncio.run_coroutine_threadsafe(_make_semaphore(), loop).result()
+                _loop = loop
+    return _loop
+
+
+async def _make_semaphore():
+    return asyncio.Semaphore(MAX_IN_FLIGHT)
+
+
+async def _bounded(coro):
+    async with _semaphore:
+        return await coro
+
+
+def gather_metered(endpoint, requests, user_id=None):
+    """
+    Sends several model calls at once on the shared loop and waits for all
+    of them. requests is a list of (contents, generation_config) pairs.
+    The quota is checked once up front (raises QuotaExceeded), and usage is
+    recorded here in the calling thread, which has the request context.
+    Returns each call's response, or the exception it raised, in order.
+    """
+    if not model:
+        raise Exception("Gemini model is not initialized.")
+    if not requests:
+        return []
+    check_quota(endpoint, user_id)
+
+    loop = get_llm_loop()
+    futures = [
+        asyncio.run_coroutine_threadsafe(
+            _bounded(model.generate_content_async(contents, generation_config=generation_config)), loop
+        )
+        for contents, generation_config in requests
+    ]
+
+    results = []
+    for future in futures:
+        try:
+            response = future.result()
+        except Exception as e:
+            results.append(e)
+            continue
+        record_usage(endpoint, response, user_id)
+        results.append(response)
+    return results
@@ -0,0 +1,108 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from flask import current_app, request, make_response
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError
+from extensions import db
+from models import DataVersion
+
+LEADERBOARD_KEY = 'leaderboard'
+
+
+def user_key(user_id):
+    return f"user:{user_id}"
+
+
+class LRUCache:
+    """Small thread-safe LRU cache for rendered HTML."""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+
+fragment_cache = LRUCache()
+_template_versions = {}
+
+
+def template_version(name):
+    """Short hash of a template's source, so cached pages expire when it changes."""
+    version = _template_versions.get(name)
+    if version is None:
+        env = current_app.jinja_env
+        source, _, _ = env.loader.get_source(env, name)
+        version = hashlib.sha1(source.encode('utf-8')).hexdigest()[:12]
+        _template_versions[name] = version
+    return version
+
+
+def get_version(key):
+    """Current version of a data key (0 if it was never written)."""
+    row = db.session.get(DataVersion, key)
+    return row.version if row else 0
+
+
+def bump_version(*keys):
+    """
+    Increments data versions in a short transaction of its own. Call it
+    after the write is committed: the caller's transaction then never
+    holds the shared version row locks (every quiz submission bumps
+    'leaderboard'), and a page rendered in between is simply re-rendered
+    under the new version.
+    """
+    try:
+        with db.engine.begin() as conn:
+            for key in keys:
+                if _increment(conn, key):
+                    continue
+                try:
+                    with conn.begin_nested():
+                        conn.execute(insert(DataVersion).values(key=key, version=1))
+                except IntegrityError:
+                    # Another request created the row first
+                    _increment(conn, key)
+    except Exception as e:
+        # Cached pages for these keys stay stale until their next bump
+        print(f"Error bumping data versions {keys}: {e}")
+
+
+def _increment(conn, key):
+    return conn.execute(
+        update(DataVersion).where(DataVersion.key == key).values(version=DataVersion.version + 1)
+    ).rowcount
+
+
+def is_not_modified(etag):
+    """True if the client already holds the representation for this ETag."""
+    return request.if_none_match.contains(etag)
+
+
+def not_modified(etag):
+    response = current_app.response_class(status=304)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def etag_response(html, etag):
+    """Wraps rendered HTML with a strong ETag; clients revalidate on every visit."""
+    response = make_response(html)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
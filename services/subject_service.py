@@ -0,0 +1,108 @@
+import re
+import difflib
+
+# --- Canonical subjects and their known aliases ---
+# Keys are canonical subject IDs, stored on QuizResult/InterviewResult.subject_id.
+# Aliases are spelling variants and abbreviations only; narrower topics such as
+# "SQL" or "Algorithms" are subjects of their own and must not be merged here.
+SUBJECTS = {
+    'os': {
+        'name': "Operating Systems",
+        'aliases': ["OS", "Operating System", "Operating Systems", "Operating Sys"]
+    },
+    'dbms': {
+        'name': "Database Management",
+        'aliases': ["DBMS", "Database", "Databases", "Database Management",
+                    "Database Management System", "Database Management Systems", "DB"]
+    },
+    'cn': {
+        'name': "Computer Networks",
+        'aliases': ["CN", "Networks", "Networking", "Computer Network",
+                    "Computer Networks", "Computer Networking"]
+    },
+    'system-design': {
+        'name': "System Design",
+        'aliases': ["System Design", "Systems Design", "SD"]
+    },
+    'dsa': {
+        'name': "Data Structures and Algorithms",
+        'aliases': ["DSA", "Data Structures and Algorithms",
+                    "Data Structures & Algorithms", "Data Structure and Algorithm"]
+    },
+    'oop': {
+        'name': "Object Oriented Programming",
+        'aliases': ["OOP", "OOPS", "OOPs", "Object Oriented Programming",
+                    "Object-Oriented Programming"]
+    },
+}
+
+# Minimum difflib ratio for a fuzzy match to count as the same subject
+FUZZY_CUTOFF = 0.85
+
+_STOPWORDS = {'and', 'of', 'the', 'in', 'for'}
+
+
+def normalize_subject(text):
+    """
+    Normalizes free-text subject input into a token string,
+    e.g. "  Operating-Systems " -> "operating system".
+    """
+    if not text:
+        return ""
+    text = text.lower().replace('&', ' and ')
+    tokens = re.findall(r'[a-z0-9+#]+', text)
+    normalized = []
+    for token in tokens:
+        if token in _STOPWORDS:
+            continue
+        # Naive singularization so "systems" and "system" share a key
+        if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+            token = token[:-1]
+        normalized.append(token)
+    return " ".join(normalized)
+
+
+def _slugify(normalized):
+    return normalized.replace(' ', '-')[:64]
+
+
+def _build_alias_index():
+    """Builds the normalized-alias -> subject ID dictionary."""
+    index = {}
+    for subject_id, info in SUBJECTS.items():
+        for alias in [subject_id, info['name']] + info['aliases']:
+            key = normalize_subject(alias)
+            if key:
+                index[key] = subject_id
+    return index
+
+
+_alias_index = _build_alias_index()
+_alias_keys = list(_alias_index.keys())
+
+
+def canonicalize_subject(text):
+    """
+    Maps free-text subject input to a (subject_id, display_name) pair.
+    Known subjects resolve through the alias index (exact, then fuzzy);
+    anything else gets a stable slug ID and keeps the user's wording.
+    """
+    normalized = normalize_subject(text)
+    if not normalized:
+        return None, (text or "").strip()
+
+    # 1. Exact lookup on normalized tokens
+    subject_id = _alias_index.get(normalized)
+
+    # 2. Fuzzy match for typos and small spelling variants
+    if subject_id is None:
+        matches = difflib.get_close_matches(normalized, _alias_keys, n=1, cutoff=FUZZY_CUTOFF)
+        if matches:
+            subject_id = _alias_index[matches[0]]
+
+    if subject_id is not None:
+        return subject_id, SUBJECTS[subject_id]['name']
+
+    # 3. Unknown subject: slug of the normalized text, original text for display
+    return _slugify(normalized), " ".join(text.split())
+
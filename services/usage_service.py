@@ -0,0 +1,224 @@
+import atexit
+import os
+import threading
+import time
+from datetime import datetime
+from functools import wraps
+from flask import current_app, has_request_context, jsonify
+from flask_login import current_user
+from sqlalchemy import update, insert, select
+from sqlalchemy.exc import IntegrityError
+from extensions import db
+from models import LLMUsage
+
+# Cached persisted totals are refreshed after this many seconds
+PERSISTED_CACHE_SECONDS = 30
+
+CALLS, PROMPT_TOKENS, OUTPUT_TOKENS, TOTAL_TOKENS = range(4)
+
+# (user_id, endpoint, day) -> [calls, prompt_tokens, output_tokens, total_tokens],
+# not yet written to the llm_usage table
+_pending = {}
+# (user_id, day) -> (expires_at, {endpoint: [calls, prompt, output, total]}) read from the table
+_persisted = {}
+_lock = threading.Lock()
+_flusher_pid = None # Process that owns the running flush thread
+
+
+class QuotaExceeded(Exception):
+    """Raised before a model call that would go over a user's quota."""
+
+
+def _current_user_id():
+    if has_request_context() and current_user.is_authenticated:
+        return current_user.id
+    return None
+
+
+def _today():
+    return datetime.utcnow().date()
+
+
+def _persisted_usage(user_id, day):
+    """Flushed totals for a user and day, cached for PERSISTED_CACHE_SECONDS."""
+    now = time.time()
+    cached = _persisted.get((user_id, day))
+    if cached and cached[0] > now:
+        return cached[1]
+
+    rows = db.session.execute(
+        select(LLMUsage.endpoint, LLMUsage.calls, LLMUsage.prompt_tokens,
+               LLMUsage.output_tokens, LLMUsage.total_tokens)
+        .where(LLMUsage.user_id == user_id, LLMUsage.day == day)
+    ).all()
+    usage = {row[0]: list(row[1:]) for row in rows}
+    _persisted[(user_id, day)] = (now + PERSISTED_CACHE_SECONDS, usage)
+    return usage
+
+
+def get_usage(user_id, day=None):
+    """Today's usage per endpoint for a user: flushed totals plus this process's pending counts."""
+    day = day or _today()
+    usage = {endpoint: list(counts) for endpoint, counts in _persisted_usage(user_id, day).items()}
+    with _lock:
+        for (uid, endpoint, d), counts in _pending.items():
+            if uid == user_id and d == day:
+                totals = usage.setdefault(endpoint, [0, 0, 0, 0])
+                for i, value in enumerate(counts):
+                    totals[i] += value
+    return usage
+
+
+def check_quota(endpoint, user_id=None):
+    """Raises QuotaExceeded if the user is already at a call or token quota."""
+    user_id = user_id or _current_user_id()
+    if user_id is None:
+        return
+
+    config = current_app.config
+    usage = get_usage(user_id)
+    total_calls = sum(counts[CALLS] for counts in usage.values())
+    total_tokens = sum(counts[TOTAL_TOKENS] for counts in usage.values())
+
+    call_quota = config.get('LLM_DAILY_CALL_QUOTA', 0)
+    if call_quota and total_calls >= call_quota:
+        raise QuotaExceeded(f"Daily AI request limit reached ({call_quota}). Please try again tomorrow.")
+
+    token_quota = config.get('LLM_DAILY_TOKEN_QUOTA', 0)
+    if token_quota and total_tokens >= token_quota:
+        raise QuotaExceeded("Daily AI usage limit reached. Please try again tomorrow.")
+
+    endpoint_quota = config.get('LLM_ENDPOINT_DAILY_QUOTAS', {}).get(endpoint, 0)
+    if endpoint_quota and usage.get(endpoint, [0])[CALLS] >= endpoint_quota:
+        raise QuotaExceeded(f"Daily limit for this feature reached ({endpoint_quota}). Please try again tomorrow.")
+
+
+def record_usage(endpoint, response, user_id=None):
+    """Adds one call and its token counts (from usage_metadata) to the pending counters."""
+    user_id = user_id or _current_user_id()
+    if user_id is None:
+        return
+
+    metadata = getattr(response, 'usage_metadata', None)
+    prompt_tokens = getattr(metadata, 'prompt_token_count', 0) or 0
+    output_tokens = getattr(metadata, 'candidates_token_count', 0) or 0
+    total_tokens = getattr(metadata, 'total_token_count', 0) or (prompt_tokens + output_tokens)
+
+    with _lock:
+        counts = _pending.setdefault((user_id, endpoint, _today()), [0, 0, 0, 0])
+        counts[CALLS] += 1
+        counts[PROMPT_TOKENS] += prompt_tokens
+        counts[OUTPUT_TOKENS] += output_tokens
+        counts[TOTAL_TOKENS] += total_tokens
+
+    _ensure_flusher(current_app._get_current_object())
+
+
+def metered(endpoint, call, *args, **kwargs):
+    """Runs a model call with quota enforcement before it and usage recording after it."""
+    check_quota(endpoint)
+    response = call(*args, **kwargs)
+    record_usage(endpoint, response)
+    return response
+
+
+def _add_counts(conn, user_id, endpoint, day, counts):
+    values = dict(
+        calls=LLMUsage.calls + counts[CALLS],
+        prompt_tokens=LLMUsage.prompt_tokens + counts[PROMPT_TOKENS],
+        output_tokens=LLMUsage.output_tokens + counts[OUTPUT_TOKENS],
+        total_tokens=LLMUsage.total_tokens + counts[TOTAL_TOKENS]
+    )
+    where = (LLMUsage.user_id == user_id, LLMUsage.endpoint == endpoint, LLMUsage.day == day)
+    return conn.execute(update(LLMUsage).where(*where).values(**values)).rowcount
+
+
+def flush_usage():
+    """
+    Writes pending counters to the llm_usage table on its own connection,
+    so it never commits the caller's session. On failure the counts are
+    put back and retried on the next flush.
+    """
+    with _lock:
+        pending = dict(_pending)
+        _pending.clear()
+    if not pending:
+        return 0
+
+    try:
+        with db.engine.begin() as conn:
+            for (user_id, endpoint, day), counts in pending.items():
+                if _add_counts(conn, user_id, endpoint, day, counts):
+                    continue
+                try:
+                    with conn.begin_nested():
+                        conn.execute(insert(LLMUsage).values(
+                            user_id=user_id, endpoint=endpoint, day=day,
+                            calls=counts[CALLS], prompt_tokens=counts[PROMPT_TOKENS],
+                            output_tokens=counts[OUTPUT_TOKENS], total_tokens=counts[TOTAL_TOKENS]
+                        ))
+                except IntegrityError:
+                    # Another process inserted the row first
+                    _add_counts(conn, user_id, endpoint, day, counts)
+    except Exception as e:
+        print(f"Error flushing LLM usage: {e}")
+        with _lock:
+            for key, counts in pending.items():
+                totals = _pending.setdefault(key, [0, 0, 0, 0])
+                for i, value in enumerate(counts):
+                    totals[i] += value
+        return 0
+
+    # Flushed counts are now part of the persisted totals
+    for user_id, _, day in pending:
+        _persisted.pop((user_id, day), None)
+    for key in [key for key in list(_persisted) if key[1] != _today()]:
+        _persisted.pop(key, None)
+    return len(pending)
+
+
+def quota_required(endpoint):
+    """Rejects a JSON API call with 429 when the user is over quota."""
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            try:
+                check_quota(endpoint)
+            except QuotaExceeded as e:
+                return jsonify({"error": str(e)}), 429
+            return current_app.ensure_sync(view)(*args, **kwargs)
+        return wrapped
+    return decorator
+
+
+def _ensure_flusher(app):
+    """
+    Starts this process's flush thread on first use. Started lazily rather
+    than at app creation, so each forked worker gets its own thread.
+    """
+    global _flusher_pid
+    pid = os.getpid()
+    if _flusher_pid == pid:
+        return
+    with _lock:
+        if _flusher_pid == pid:
+            return
+        _flusher_pid = pid
+    interval = app.config.get('USAGE_FLUSH_SECONDS', 30)
+    threading.Thread(target=_flush_loop, args=(app, interval), name="usage-flush", daemon=True).start()
+
+
+def _flush_loop(app, interval):
+    """Writes pending counters every `interval` seconds, even when the worker is idle."""
+    while True:
+        time.sleep(interval)
+        with app.app_context():
+            flush_usage()
+
+
+def init_usage(app):
+    """Flushes pending counters when the process exits."""
+    def flush_on_exit():
+        with app.app_context():
+            flush_usage()
+    atexit.register(flush_on_exit)